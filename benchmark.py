@@ -0,0 +1,157 @@
+# Himawari 数据处理基准测试
+
+import argparse
+import logging
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from satpy import Scene
+
+from hsd_reader import open_segments, stitch_segments
+from hsd_utils import parse_hsd_filename
+from objective_main import (DATA_ROOT_DIR, DECOMPRESSED_DIR, MAX_DECOMPRESSION_THREADS, SATELLITE_READER,
+                            HimawariProcessor)
+
+BACKENDS = ["thread", "process", "auto"]
+ENGINES = ["stdlib", "parallel"]
+
+
+def benchmark_decompression(bz2_files: list[Path],
+                            backends: list[str],
+                            engines: list[str],
+                            max_workers: int,
+                            scratch_dir: Path | None = None) -> list[dict]:
+    """
+    用每种 (方式, 引擎) 组合解压同一批文件，返回耗时和吞吐量 (MB/s)。
+    每次都解压到新的临时目录，避免命中已解压的文件。
+    进程池中的文件总是用 stdlib 解压，parallel 引擎只与 thread 方式组合，其余组合跳过。
+    """
+    processor = HimawariProcessor()
+    input_bytes = sum(f.stat().st_size for f in bz2_files)
+    results = []
+    for backend in backends:
+        for engine in engines:
+            if engine == "parallel" and backend != "thread":
+                logging.info("跳过 %s/%s：进程池中的文件总是用 stdlib 解压。", backend, engine)
+                continue
+            output_dir = Path(tempfile.mkdtemp(prefix="hsd_bench_", dir=scratch_dir))
+            try:
+                start = time.perf_counter()
+                decompressed = processor.decompress_files_multithreaded(
+                    bz2_files, output_dir, max_workers, engine=engine, backend=backend
+                )
+                elapsed = time.perf_counter() - start
+                output_bytes = sum(p.stat().st_size for p in decompressed.values() if p)
+                results.append({
+                    "backend": backend,
+                    "engine": engine,
+                    "seconds": elapsed,
+                    "input_mb_s": input_bytes / 1e6 / elapsed,
+                    "output_mb_s": output_bytes / 1e6 / elapsed,
+                    "failed": sum(1 for p in decompressed.values() if p is None),
+                })
+            finally:
+                shutil.rmtree(output_dir, ignore_errors=True)
+    return results
+
+
+def benchmark_reader(dat_files: list[Path], band: str, repeat: int = 3) -> list[dict]:
+    """
+    比较 Satpy ahi_hsd 读取器和 hsd_reader 读取并定标同一波段全部分段的耗时，取 repeat 次中最快的一次。
+    """
+    input_bytes = sum(f.stat().st_size for f in dat_files)
+
+    def read_satpy():
+        scn = Scene([str(f) for f in dat_files], reader=SATELLITE_READER)
+        scn.load([band])
+        return scn[band].values
+
+    def read_native():
+        return stitch_segments(open_segments(dat_files)[band])
+
+    results = []
+    for name, read in (("satpy", read_satpy), ("native", read_native)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = read()
+            timings.append(time.perf_counter() - start)
+        elapsed = min(timings)
+        results.append({
+            "reader": name,
+            "seconds": elapsed,
+            "input_mb_s": input_bytes / 1e6 / elapsed,
+            "shape": "x".join(str(n) for n in data.shape),
+        })
+    return results
+
+
+def print_table(rows: list[dict], columns: list[tuple[str, str, str]]):
+    ''' 以对齐的表格打印结果。columns 为 (键, 表头, 格式)。'''
+    header = "  ".join(f"{title:>12}" for _, title, _ in columns)
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print("  ".join(f"{row[key]:>12{fmt}}" for key, _, fmt in columns))
+
+
+def main():
+    ''' 基准测试入口。'''
+    parser = argparse.ArgumentParser(description="Himawari 数据处理基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    decompress_parser = subparsers.add_parser("decompress", help="比较各解压方式和引擎的吞吐量")
+    decompress_parser.add_argument("data_dir", nargs="?", type=Path, default=DATA_ROOT_DIR,
+                                   help=f"包含 .DAT.bz2 文件的目录 (默认 {DATA_ROOT_DIR})")
+    decompress_parser.add_argument("--limit", type=int, default=20, help="最多使用的文件数 (默认 20)")
+    decompress_parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    decompress_parser.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    decompress_parser.add_argument("--workers", type=int, default=MAX_DECOMPRESSION_THREADS,
+                                   help=f"并发数 (默认 {MAX_DECOMPRESSION_THREADS})")
+    decompress_parser.add_argument("--scratch-dir", type=Path, default=None,
+                                   help="临时解压目录所在位置 (默认系统临时目录)")
+
+    reader_parser = subparsers.add_parser("reader", help="比较 Satpy 读取器和 hsd_reader 的读取速度")
+    reader_parser.add_argument("data_dir", nargs="?", type=Path, default=DECOMPRESSED_DIR,
+                               help=f"包含已解压 .DAT 文件的目录 (默认 {DECOMPRESSED_DIR})")
+    reader_parser.add_argument("--band", default="B13", help="要读取的波段 (默认 B13)")
+    reader_parser.add_argument("--repeat", type=int, default=3, help="每种读取方式重复次数 (默认 3)")
+
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.command == "decompress":
+        bz2_files = sorted(args.data_dir.rglob("HS_*.DAT.bz2"))[:args.limit]
+        if not bz2_files:
+            print(f"在 {args.data_dir} 中没有找到 .DAT.bz2 文件。")
+            return
+        total_mb = sum(f.stat().st_size for f in bz2_files) / 1e6
+        print(f"{len(bz2_files)} 个文件, 共 {total_mb:.1f} MB (压缩后), 并发数 {args.workers}\n")
+        rows = benchmark_decompression(bz2_files, args.backends, args.engines, args.workers, args.scratch_dir)
+        print_table(rows, [("backend", "backend", "s"), ("engine", "engine", "s"),
+                           ("seconds", "seconds", ".2f"), ("input_mb_s", "in MB/s", ".1f"),
+                           ("output_mb_s", "out MB/s", ".1f"), ("failed", "failed", "d")])
+    elif args.command == "reader":
+        # 使用最早的一个时间点中该波段的所有分段
+        slots = defaultdict(list)
+        for dat_file in args.data_dir.rglob("HS_*.DAT"):
+            info = parse_hsd_filename(dat_file.name)
+            if info and f"B{info.band}" == args.band:
+                slots[info.timestamp].append(dat_file)
+        if not slots:
+            print(f"在 {args.data_dir} 中没有找到 {args.band} 的 .DAT 文件。")
+            return
+        timestamp = min(slots)
+        dat_files = sorted(slots[timestamp])
+        total_mb = sum(f.stat().st_size for f in dat_files) / 1e6
+        print(f"{args.band} {timestamp}: {len(dat_files)} 个分段, 共 {total_mb:.1f} MB\n")
+        rows = benchmark_reader(dat_files, args.band, args.repeat)
+        print_table(rows, [("reader", "reader", "s"), ("seconds", "seconds", ".3f"),
+                           ("input_mb_s", "in MB/s", ".1f"), ("shape", "shape", "s")])
+
+
+if __name__ == "__main__":
+    main()
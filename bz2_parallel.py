@@ -0,0 +1,141 @@
+# bzip2 块级并行解压
+#
+# bzip2 流由相互独立的压缩块组成，每个块以 48 位魔数 0x314159265359 开头，
+# 流末尾是 48 位结束标记 0x177245385090 和 32 位合并 CRC。块边界不按字节对齐，
+# 因此先在所有 8 种位偏移下查找魔数，再把每个块单独包装成一个只含一个块的
+# 完整 bzip2 流（单块流的合并 CRC 就等于块 CRC），交给多个进程解压后按顺序拼接。
+
+import bz2
+import concurrent.futures
+import logging
+import os
+import shutil
+from pathlib import Path
+
+BLOCK_MAGIC = bytes.fromhex("314159265359")
+EOS_MAGIC = bytes.fromhex("177245385090")
+_EOS_MAGIC_INT = int.from_bytes(EOS_MAGIC, "big")
+
+# 小于该大小的文件直接用标准库解压，拆块的开销不划算
+PARALLEL_MIN_SIZE = 4 * 1024 * 1024
+
+
+def _find_pattern_bits(data: bytes, pattern: bytes) -> list[int]:
+    """
+    查找 48 位 pattern 在 data 中出现的所有位偏移（不要求字节对齐）。
+
+    对每种位偏移 shift，pattern 中完整落在字节内的 5 个字节是固定的，
+    先用 bytes.find 查找这 5 个字节，再核对首尾两个不完整字节中属于 pattern 的位。
+    """
+    positions = []
+    pattern_value = int.from_bytes(pattern, "big")
+    start = data.find(pattern)
+    while start != -1:
+        positions.append(start * 8)
+        start = data.find(pattern, start + 1)
+
+    for shift in range(1, 8):
+        window = (pattern_value << (8 - shift)).to_bytes(7, "big")
+        core = window[1:6]
+        head_mask = 0xFF >> shift
+        tail_mask = (0xFF << (8 - shift)) & 0xFF
+        start = data.find(core, 1)
+        while start != -1:
+            i = start - 1
+            if (i + 6 < len(data)
+                    and data[i] & head_mask == window[0] & head_mask
+                    and data[i + 6] & tail_mask == window[6] & tail_mask):
+                positions.append(i * 8 + shift)
+            start = data.find(core, start + 1)
+    return sorted(positions)
+
+
+def split_blocks(data: bytes) -> list[tuple[int, int]] | None:
+    """
+    把单个 bzip2 流拆成块，返回每个块的 (起始位, 结束位)。
+    不是单个标准 bzip2 流时返回 None。
+    """
+    if len(data) < 14 or data[:3] != b"BZh" or data[3:4] not in b"123456789":
+        return None
+
+    block_starts = _find_pattern_bits(data, BLOCK_MAGIC)
+    eos_positions = _find_pattern_bits(data, EOS_MAGIC)
+    if not block_starts or block_starts[0] != 32 or not eos_positions:
+        return None
+
+    # 流结束标记之后只能是 CRC 和填充位，否则是多个流拼接而成
+    eos = eos_positions[-1]
+    if (eos + 48 + 32 + 7) // 8 != len(data):
+        return None
+    block_starts = [start for start in block_starts if start < eos]
+    return list(zip(block_starts, block_starts[1:] + [eos]))
+
+
+def _decompress_block(job: tuple[bytes, int, int, bytes]) -> bytes:
+    """
+    在子进程中把一个块包装成独立的 bzip2 流并解压。
+    """
+    chunk, bit_offset, bit_count, header = job
+    value = int.from_bytes(chunk, "big")
+    block = (value >> (len(chunk) * 8 - bit_offset - bit_count)) & ((1 << bit_count) - 1)
+    block_crc = (block >> (bit_count - 48 - 32)) & 0xFFFFFFFF
+
+    stream = int.from_bytes(header, "big")
+    stream = (stream << bit_count) | block
+    stream = (stream << 48) | _EOS_MAGIC_INT
+    stream = (stream << 32) | block_crc
+    total_bits = 32 + bit_count + 80
+    padding = -total_bits % 8
+    stream <<= padding
+    return bz2.decompress(stream.to_bytes((total_bits + padding) // 8, "big"))
+
+
+def _decompress_serial(bz2_file_path: Path, output_path: Path):
+    with bz2.open(bz2_file_path, "rb") as f_in:
+        with open(output_path, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+
+
+def decompress_file_parallel(bz2_file_path: Path,
+                             output_path: Path,
+                             executor: concurrent.futures.Executor | None = None,
+                             max_workers: int | None = None):
+    """
+    按块并行解压一个 .bz2 文件到 output_path。
+
+    传入 executor 时复用它（多个文件共享一个进程池），否则临时创建一个进程池。
+    文件太小、不是单个 bzip2 流或拆块解压失败时退回标准库逐流解压。
+    """
+    if bz2_file_path.stat().st_size < PARALLEL_MIN_SIZE:
+        _decompress_serial(bz2_file_path, output_path)
+        return
+
+    data = bz2_file_path.read_bytes()
+    blocks = split_blocks(data)
+    if not blocks or len(blocks) < 2:
+        del data
+        _decompress_serial(bz2_file_path, output_path)
+        return
+
+    header = data[:4]
+    jobs = [
+        (data[start // 8:(end + 7) // 8], start % 8, end - start, header)
+        for start, end in blocks
+    ]
+    del data
+
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+    try:
+        with open(output_path, "wb") as f_out:
+            # map 保证结果按块的顺序返回
+            for decompressed in executor.map(_decompress_block, jobs):
+                f_out.write(decompressed)
+    except (OSError, ValueError, EOFError) as e:
+        # 压缩数据中偶然出现的魔数会导致错误的拆分，bz2 的 CRC 校验会发现它
+        logging.warning("块级并行解压失败，改用标准解压 %s: %s", bz2_file_path.name, e)
+        _decompress_serial(bz2_file_path, output_path)
+    finally:
+        if own_executor:
+            executor.shutdown()
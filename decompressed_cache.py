@@ -0,0 +1,170 @@
+# 解压目录的容量管理：按字节上限做 LRU 淘汰
+#
+# 解压目录中的 .DAT 文件就是缓存项，文件名为键。最近访问时间记录在目录下的
+# JSON 索引中（不依赖文件系统的 atime，很多卷以 noatime 挂载）；没有记录的
+# 文件按修改时间处理。正在处理的时间点通过 pinned() 固定，淘汰时跳过。
+#
+# 多个进程（例如 pipeline.py 和 objective_main.py）可以共用同一目录：索引的
+# 读-合并-写和淘汰都在 .cache_index.lock 文件锁内进行，先重新读取索引，访问时间
+# 取各进程记录的最大值。固定记录在 .pins/ 下的 .pin 文件中，固定期间持有对应的
+# .pin.lock，淘汰时读取所有仍被持有的 .pin 文件；持有者崩溃后遗留的文件视为失效并删除。
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Iterable
+
+from file_lock import file_lock, is_locked
+
+INDEX_FILENAME = ".cache_index.json"
+PINS_DIRNAME = ".pins"
+
+
+class DecompressedCache:
+    '解压文件缓存，超过 max_bytes 时按最近访问时间淘汰'
+
+    def __init__(self, cache_dir: Path, max_bytes: int, index_file: Path | None = None):
+        """
+        max_bytes 为 0 或负数时不限制大小，只记录访问时间。
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.index_file = index_file or self.cache_dir / INDEX_FILENAME
+        self.pins_dir = self.cache_dir / PINS_DIRNAME
+        self._index_lock = self.index_file.with_name(self.index_file.name + ".lock")
+        self._last_access: dict[str, float] = {}
+        self._load()
+
+    def _load(self):
+        ''' 重新读取索引，与本进程的记录合并（取较新的访问时间）。'''
+        if not self.index_file.exists():
+            return
+        try:
+            entries = json.loads(self.index_file.read_text(encoding="utf-8"))
+            for name, ts in entries.items():
+                self._last_access[name] = max(float(ts), self._last_access.get(name, 0.0))
+        except (OSError, ValueError, AttributeError) as e:
+            logging.warning("忽略无法读取的缓存索引 %s: %s", self.index_file, e)
+
+    def _save(self):
+        try:
+            temp_path = self.index_file.with_name(
+                f"{self.index_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            temp_path.write_text(json.dumps(self._last_access), encoding="utf-8")
+            os.replace(temp_path, self.index_file)
+        except OSError as e:
+            logging.warning("无法写入缓存索引 %s: %s", self.index_file, e)
+
+    def _key(self, path: Path) -> str | None:
+        ''' 只管理缓存目录下的文件，其它路径返回 None。'''
+        path = Path(path)
+        if path.parent.resolve() != self.cache_dir.resolve():
+            return None
+        return path.name
+
+    def touch(self, paths: Iterable[Path]):
+        """
+        记录文件被访问（命中或新解压）。
+        """
+        now = time.time()
+        keys = [key for key in map(self._key, paths) if key]
+        with file_lock(self._index_lock):
+            self._load()
+            for key in keys:
+                self._last_access[key] = now
+            self._save()
+
+    @contextlib.contextmanager
+    def pinned(self, paths: Iterable[Path]):
+        """
+        在 with 块内固定这些文件，任何共用该目录的进程淘汰时都不会删除。可以嵌套、可跨线程使用。
+        """
+        keys = [key for key in map(self._key, paths) if key]
+        if not keys:
+            yield
+            return
+        pin_path = self.pins_dir / f"{os.getpid()}_{uuid.uuid4().hex}.pin"
+        with contextlib.ExitStack() as stack:
+            # 在索引锁内创建，淘汰不会看到只写了一半或尚未加锁的固定记录
+            with file_lock(self._index_lock):
+                self.pins_dir.mkdir(parents=True, exist_ok=True)
+                stack.enter_context(file_lock(pin_path.with_name(pin_path.name + ".lock")))
+                pin_path.write_text(json.dumps(keys), encoding="utf-8")
+            try:
+                yield
+            finally:
+                # 先删除记录再释放锁
+                with contextlib.suppress(OSError):
+                    pin_path.unlink()
+
+    def _pinned_names(self) -> set[str]:
+        ''' 所有进程当前固定的文件名；在索引锁内调用。持有者已退出的固定记录被删除。'''
+        names: set[str] = set()
+        if not self.pins_dir.is_dir():
+            return names
+        for pin_path in self.pins_dir.glob("*.pin"):
+            lock_path = pin_path.with_name(pin_path.name + ".lock")
+            if not is_locked(lock_path):
+                for stale_path in (pin_path, lock_path):
+                    with contextlib.suppress(OSError):
+                        stale_path.unlink()
+                continue
+            try:
+                names.update(json.loads(pin_path.read_text(encoding="utf-8")))
+            except (OSError, ValueError) as e:
+                logging.warning("忽略无法读取的固定记录 %s: %s", pin_path.name, e)
+        return names
+
+    def evict(self) -> int:
+        """
+        删除最久未访问且未固定的文件，直到总大小不超过 max_bytes。返回释放的字节数。
+        正在被其他任务解压（持有 .lock）的文件也不会删除。
+        """
+        if self.max_bytes <= 0:
+            return 0
+        with file_lock(self._index_lock):
+            self._load()
+            pinned = self._pinned_names()
+            entries = []
+            total = 0
+            for path in self.cache_dir.glob("*.DAT"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                total += stat.st_size
+                entries.append((self._last_access.get(path.name, stat.st_mtime), path, stat.st_size))
+
+            # 索引中已不存在的文件不再记录
+            existing = {path.name for _, path, _ in entries}
+            self._last_access = {name: ts for name, ts in self._last_access.items() if name in existing}
+
+            freed = 0
+            removed = 0
+            for _, path, size in sorted(entries, key=lambda entry: entry[0]):
+                if total - freed <= self.max_bytes:
+                    break
+                if path.name in pinned or is_locked(path.with_name(path.name + ".lock")):
+                    continue
+                try:
+                    path.unlink()
+                except OSError as e:
+                    logging.warning("无法删除缓存文件 %s: %s", path.name, e)
+                    continue
+                self._last_access.pop(path.name, None)
+                freed += size
+                removed += 1
+            self._save()
+
+        if removed:
+            logging.info("解压缓存超过上限 %.1f GB，已淘汰 %s 个文件，释放 %.1f GB。",
+                         self.max_bytes / 1024 ** 3, removed, freed / 1024 ** 3)
+        if total - freed > self.max_bytes:
+            logging.warning("解压缓存仍有 %.1f GB（上限 %.1f GB），其余文件正在使用中。",
+                            (total - freed) / 1024 ** 3, self.max_bytes / 1024 ** 3)
+        return freed
@@ -1,12 +1,22 @@
+import argparse
+import bz2
+import contextlib
+import json
 import logging
 import os
+import queue
 import sys
-from datetime import datetime, timedelta
-from typing import Set, Dict, Optional, List
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Set, Dict, Optional, List, NamedTuple, BinaryIO, Callable, Tuple
 
 import paramiko
 import paramiko.sftp_client
 
+from hsd_utils import (AHI_BAND_RESOLUTION, FLDK_SEGMENTS, NAMED_REGIONS, BBox, HsdIndex,
+                       build_hsd_index, parse_bbox, segments_for_bbox, validate_hsd_file)
+
 # --- Configuration ---
 # Option 1: Import from a separate config.py file
 # Make sure you have a config.py file in the same directory with:
@@ -37,12 +47,56 @@ DEFAULT_TARGET_BANDS: Set[str] = {"01", "02", "03", '04', "08", '07', "13"} # Us
 # Local directory to save data
 LOCAL_DATA_DIR = "./data"
 
+# Where --decompress writes .DAT files (same as objective_main.DECOMPRESSED_DIR)
+DECOMPRESSED_DATA_DIR = "./decompressed_data"
+
+# Number of parallel SFTP channels used to download files (1 = sequential)
+DEFAULT_DOWNLOAD_WORKERS = 4
+# Read size for remote files
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Watch mode: seconds between polls and upper bound of the backoff after failures
+WATCH_POLL_INTERVAL = 60.0
+WATCH_MAX_BACKOFF = 600.0
+
+# On-disk cache of remote hour directory listings (only closed past hours are persisted)
+LISTING_CACHE_FILE = os.path.join(LOCAL_DATA_DIR, ".listing_cache.json")
+LISTING_CACHE_TTL_HOURS = 24.0
+# An hour directory is considered closed once this much time has passed after the hour ended
+LISTING_CLOSED_HOUR_GRACE = timedelta(minutes=30)
+
 # --- Logging Setup ---
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- Global variable to track current download for cleanup ---
-current_temp_file_path: Optional[str] = None
+# --- Global state to track in-flight downloads for cleanup ---
+active_temp_file_paths: Set[str] = set()
+_temp_file_lock = threading.Lock()
+
+
+class DownloadSizeMismatchError(Exception):
+    """Raised when a finished transfer does not have the size of the remote file."""
+
+
+class RemoteFileAttr(NamedTuple):
+    """Size and modification time of a remote file, as reported by the directory listing."""
+    size: int
+    mtime: int
+
+
+class DownloadTask(NamedTuple):
+    """A single remote file to fetch and where to store it locally."""
+    remote_path: str
+    local_path: str
+    # Taken from the directory listing when known, so no extra remote stat is needed
+    remote_size: Optional[int] = None
+    remote_mtime: Optional[int] = None
+    # Also treat a local file with a different mtime as stale
+    verify_mtime: bool = False
+    # If set, the stream is decompressed on the fly and written to this .DAT path
+    decompressed_path: Optional[str] = None
+    # In decompress mode, also keep the .bz2 at local_path
+    keep_compressed: bool = True
 
 # --- Functions ---
 
@@ -112,10 +166,595 @@ def extract_date_time_info(time_object: datetime) -> Dict[str, str]:
         'minute': time_object.strftime("%M")
     }
 
+class RemoteListingCache:
+    """
+    Caches remote directory listings keyed by remote directory.
+
+    Every directory is listed at most once per run. Listings of hours that are
+    already closed (the hour ended more than LISTING_CLOSED_HOUR_GRACE ago, in UTC)
+    can optionally be persisted to a JSON file and reused by later runs until
+    they are older than the TTL.
+    """
+
+    def __init__(self, cache_file: Optional[str] = None, ttl_hours: float = LISTING_CACHE_TTL_HOURS):
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_hours * 3600
+        self._listings: Dict[str, Dict[str, RemoteFileAttr]] = {}
+        self._indexes: Dict[str, HsdIndex] = {}
+        self._persisted: Dict[str, Dict] = {}
+        self._dirty = False
+        if cache_file:
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable listing cache {self.cache_file}: {e}")
+            return
+        now = time.time()
+        self._persisted = {remote_dir: entry for remote_dir, entry in entries.items()
+                           if "files" in entry and now - entry.get("fetched_at", 0) <= self.ttl_seconds}
+        logging.info(f"Loaded {len(self._persisted)} cached directory listings from {self.cache_file}")
+
+    def save(self) -> None:
+        """Writes persisted listings back to the cache file, if anything changed."""
+        if not self.cache_file or not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+            temp_path = self.cache_file + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._persisted, f)
+            os.replace(temp_path, self.cache_file)
+            self._dirty = False
+        except OSError as e:
+            logging.warning(f"Could not write listing cache {self.cache_file}: {e}")
+
+    @staticmethod
+    def is_hour_closed(hour_start: datetime) -> bool:
+        """Whether no more files are expected in the directory of this (UTC) hour."""
+        now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+        return hour_start + timedelta(hours=1) + LISTING_CLOSED_HOUR_GRACE <= now_utc
+
+    def listdir(self, sftp_obj: paramiko.sftp_client.SFTPClient, remote_dir: str,
+                hour_start: datetime, refresh: bool = False) -> Dict[str, RemoteFileAttr]:
+        """
+        Returns the listing of remote_dir, querying the server only on a cache miss.
+
+        :param sftp_obj: Active SFTP client object.
+        :param remote_dir: Remote hour directory to list.
+        :param hour_start: Start of the hour the directory belongs to, used to decide persistence.
+        :param refresh: Always query the server and replace the cached listing.
+        :return: A dictionary mapping file names in the directory to their size and mtime.
+        """
+        if refresh:
+            self._indexes.pop(remote_dir, None)
+        elif remote_dir in self._listings:
+            return self._listings[remote_dir]
+
+        entry = None if refresh else self._persisted.get(remote_dir)
+        if entry is not None:
+            logging.debug(f"Using persisted listing for {remote_dir}")
+            files = {name: RemoteFileAttr(*attr) for name, attr in entry["files"].items()}
+            self._listings[remote_dir] = files
+            return files
+
+        # listdir_attr returns sizes and mtimes in the same round trip as the names
+        files = {attr.filename: RemoteFileAttr(attr.st_size, attr.st_mtime)
+                 for attr in sftp_obj.listdir_attr(remote_dir)}
+        self._listings[remote_dir] = files
+        if self.cache_file and self.is_hour_closed(hour_start):
+            self._persisted[remote_dir] = {"fetched_at": time.time(),
+                                           "files": {name: list(attr) for name, attr in files.items()}}
+            self._dirty = True
+        return files
+
+    def index(self, sftp_obj: paramiko.sftp_client.SFTPClient, remote_dir: str, hour_start: datetime) -> HsdIndex:
+        """Returns the (timestamp, band, segment) index of the FLDK .DAT.bz2 files in remote_dir."""
+        if remote_dir not in self._indexes:
+            self._indexes[remote_dir] = build_hsd_index(self.listdir(sftp_obj, remote_dir, hour_start))
+        return self._indexes[remote_dir]
+
+def _track_temp_file(path: str) -> None:
+    with _temp_file_lock:
+        active_temp_file_paths.add(path)
+
+def _untrack_temp_file(path: str) -> None:
+    with _temp_file_lock:
+        active_temp_file_paths.discard(path)
+
+def _transfer_file(sftp_obj: paramiko.sftp_client.SFTPClient, remote_path: str, temp_local_file_path: str,
+                   remote_size: Optional[int] = None) -> None:
+    """
+    Fetches a remote file into temp_local_file_path, resuming from the bytes already present.
+
+    :param sftp_obj: SFTP client (channel) to use for the transfer.
+    :param remote_path: Path of the remote file.
+    :param temp_local_file_path: Local .part file, appended to if it already holds a prefix of the file.
+    :param remote_size: Size of the remote file if already known; stat'ed otherwise.
+    :raises DownloadSizeMismatchError: If the local size does not match the remote size after the transfer.
+    """
+    if remote_size is None:
+        remote_size = sftp_obj.stat(remote_path).st_size
+    offset = os.path.getsize(temp_local_file_path) if os.path.exists(temp_local_file_path) else 0
+    if offset > remote_size:
+        logging.warning(f"Partial file {temp_local_file_path} is larger than the remote file ({offset} > {remote_size} bytes). Restarting.")
+        offset = 0
+    elif offset:
+        logging.info(f"Resuming {remote_path} at byte {offset} of {remote_size}")
+
+    if offset < remote_size:
+        with sftp_obj.open(remote_path, "rb") as remote_file, \
+                open(temp_local_file_path, "ab" if offset else "wb") as local_file:
+            remote_file.seek(offset)
+            # Pipeline the read requests from the current offset instead of one round trip per chunk
+            remote_file.prefetch(remote_size)
+            while True:
+                chunk = remote_file.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                local_file.write(chunk)
+
+    local_size = os.path.getsize(temp_local_file_path)
+    if local_size != remote_size:
+        raise DownloadSizeMismatchError(f"size mismatch after transfer ({local_size} != {remote_size} bytes)")
+
+def local_file_matches(task: DownloadTask) -> bool:
+    """
+    Checks whether the local file of a task is a complete copy of the remote file.
+
+    Without a known remote size any existing file counts as complete.
+    """
+    try:
+        local_stat = os.stat(task.local_path)
+    except FileNotFoundError:
+        return False
+    if task.remote_size is not None and local_stat.st_size != task.remote_size:
+        return False
+    if task.verify_mtime and task.remote_mtime is not None and int(local_stat.st_mtime) != task.remote_mtime:
+        return False
+    return True
+
+def task_is_complete(task: DownloadTask) -> bool:
+    """
+    Checks whether every local output of a task is already present.
+
+    An existing .DAT only counts if its HSD header matches its size (see validate_hsd_file).
+    """
+    if task.decompressed_path is None:
+        return local_file_matches(task)
+    if not os.path.exists(task.decompressed_path):
+        return False
+    problem = validate_hsd_file(task.decompressed_path)
+    if problem is not None:
+        logging.warning(f"Decompressed file {task.decompressed_path} is incomplete ({problem}). Re-creating it.")
+        return False
+    return not task.keep_compressed or local_file_matches(task)
+
+def _stream_decompress(source: BinaryIO, output: BinaryIO, raw_copy: Optional[BinaryIO] = None) -> int:
+    """
+    Decompresses a bzip2 stream chunk by chunk as it is read.
+
+    Concatenated bzip2 streams are supported.
+
+    :param source: File object to read compressed bytes from.
+    :param output: File object the decompressed bytes are written to.
+    :param raw_copy: Optional file object that receives a copy of the compressed bytes.
+    :return: Number of compressed bytes read.
+    :raises EOFError: If the input ends in the middle of a bzip2 stream.
+    """
+    decompressor = bz2.BZ2Decompressor()
+    in_stream = False
+    bytes_read = 0
+    while True:
+        chunk = source.read(DOWNLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        bytes_read += len(chunk)
+        if raw_copy is not None:
+            raw_copy.write(chunk)
+        while chunk:
+            in_stream = True
+            output.write(decompressor.decompress(chunk))
+            chunk = b""
+            if decompressor.eof:
+                # Start over on whatever follows the end of this stream
+                in_stream = False
+                chunk = decompressor.unused_data
+                decompressor = bz2.BZ2Decompressor()
+    if in_stream or bytes_read == 0:
+        raise EOFError("compressed stream ended before the end-of-stream marker")
+    return bytes_read
+
+def _reclaim_stale_file(task: DownloadTask, temp_local_file_path: str) -> None:
+    """Moves a truncated local file back to .part so it is resumed, or removes an unusable one."""
+    local_size = os.path.getsize(task.local_path)
+    part_size = os.path.getsize(temp_local_file_path) if os.path.exists(temp_local_file_path) else -1
+    truncated = (task.remote_size is not None and local_size < task.remote_size
+                 and not (task.verify_mtime and task.remote_mtime is not None))
+    if truncated and local_size > part_size:
+        logging.warning(f"Local file {task.local_path} is truncated ({local_size} of {task.remote_size} bytes). Resuming it.")
+        os.replace(task.local_path, temp_local_file_path)
+    else:
+        logging.warning(f"Local file {task.local_path} does not match the remote file. Downloading it again.")
+        os.remove(task.local_path)
+
+def _remove_temp_files(*paths: Optional[str]) -> None:
+    for path in paths:
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+                logging.info(f"Removed partial file: {path}")
+            except OSError as remove_err:
+                logging.error(f"Error removing partial file {path}: {remove_err}")
+
+def download_and_decompress_file(sftp_obj: paramiko.sftp_client.SFTPClient, task: DownloadTask) -> bool:
+    """
+    Downloads a .DAT.bz2 file and decompresses it while the bytes arrive.
+
+    The .DAT lands in task.decompressed_path as soon as the transfer finishes, without
+    writing and re-reading the compressed file first. With task.keep_compressed the
+    .bz2 is written alongside. If a complete .bz2 is already present locally it is
+    decompressed from disk instead. A decompressor cannot continue mid-stream, so interrupted
+    transfers in this mode start from the beginning.
+
+    :param sftp_obj: SFTP client (channel) to use for the transfer.
+    :param task: The remote file, its local .bz2 destination and the .DAT destination.
+    :return: True if the outputs are available locally afterwards, False on failure.
+    """
+    decompressed_path = task.decompressed_path
+    if task_is_complete(task):
+        logging.info(f"File already exists locally: {decompressed_path}. Skipping.")
+        return True
+
+    have_compressed = local_file_matches(task)
+    temp_decompressed_path = decompressed_path + ".part"
+    temp_compressed_path = task.local_path + ".part" if task.keep_compressed and not have_compressed else None
+
+    try:
+        _track_temp_file(temp_decompressed_path)
+        if temp_compressed_path:
+            _track_temp_file(temp_compressed_path)
+
+        if have_compressed:
+            logging.info(f"Decompressing local copy {task.local_path} to {decompressed_path}")
+            with open(task.local_path, "rb") as source, open(temp_decompressed_path, "wb") as output:
+                _stream_decompress(source, output)
+        else:
+            logging.info(f"Downloading and decompressing {task.remote_path} to {decompressed_path}")
+            remote_size = task.remote_size
+            if remote_size is None:
+                remote_size = sftp_obj.stat(task.remote_path).st_size
+            with sftp_obj.open(task.remote_path, "rb") as remote_file, \
+                    open(temp_decompressed_path, "wb") as output, \
+                    (open(temp_compressed_path, "wb") if temp_compressed_path else contextlib.nullcontext()) as raw_copy:
+                remote_file.prefetch(remote_size)
+                bytes_read = _stream_decompress(remote_file, output, raw_copy)
+            if bytes_read != remote_size:
+                raise DownloadSizeMismatchError(f"size mismatch after transfer ({bytes_read} != {remote_size} bytes)")
+            if temp_compressed_path:
+                if task.remote_mtime is not None:
+                    os.utime(temp_compressed_path, (task.remote_mtime, task.remote_mtime))
+                os.rename(temp_compressed_path, task.local_path)
+
+        os.replace(temp_decompressed_path, decompressed_path)
+        logging.info(f"Successfully decompressed and saved: {decompressed_path}")
+        return True
+
+    except Exception as download_err:
+        logging.error(f"Failed to download/decompress {task.remote_path}: {download_err}")
+        _remove_temp_files(temp_decompressed_path, temp_compressed_path)
+        return False
+    finally:
+        _untrack_temp_file(temp_decompressed_path)
+        if temp_compressed_path:
+            _untrack_temp_file(temp_compressed_path)
+
+def download_file(sftp_obj: paramiko.sftp_client.SFTPClient, task: DownloadTask) -> bool:
+    """
+    Downloads a single remote file via a temporary .part file.
+
+    An existing .part file is resumed from its current size. It is kept when a
+    transfer fails so the next attempt only fetches the remaining bytes.
+
+    :param sftp_obj: SFTP client (channel) to use for the transfer.
+    :param task: The remote file and its local destination.
+    :return: True if the file is available locally afterwards, False on failure.
+    """
+    if task.decompressed_path is not None:
+        return download_and_decompress_file(sftp_obj, task)
+
+    local_file_path = task.local_path
+    temp_local_file_path = local_file_path + ".part"
+
+    if local_file_matches(task):
+        logging.info(f"File already exists locally: {local_file_path}. Skipping.")
+        return True
+    if os.path.exists(local_file_path):
+        try:
+            _reclaim_stale_file(task, temp_local_file_path)
+        except OSError as e:
+            logging.error(f"Could not replace stale local file {local_file_path}: {e}")
+            return False
+    if os.path.exists(temp_local_file_path):
+        logging.warning(f"Partial file exists: {temp_local_file_path}. Attempting to resume.")
+
+    logging.info(f"Downloading {task.remote_path} to {temp_local_file_path}")
+    try:
+        _track_temp_file(temp_local_file_path)
+        _transfer_file(sftp_obj, task.remote_path, temp_local_file_path, task.remote_size)
+        if task.remote_mtime is not None:
+            # Keep the remote mtime so later runs can compare against the listing
+            os.utime(temp_local_file_path, (task.remote_mtime, task.remote_mtime))
+        os.rename(temp_local_file_path, local_file_path)
+        logging.info(f"Successfully downloaded and saved: {local_file_path}")
+        return True
+
+    except DownloadSizeMismatchError as size_err:
+        # A complete transfer with the wrong size cannot be resumed; start over next time.
+        logging.error(f"Failed to download {task.remote_path}: {size_err}")
+        _remove_temp_files(temp_local_file_path)
+        return False
+    except Exception as download_err:
+        logging.error(f"Failed to download {task.remote_path}: {download_err}")
+        if os.path.exists(temp_local_file_path):
+            logging.info(f"Keeping partial download for resume: {temp_local_file_path}")
+        return False
+    finally:
+        _untrack_temp_file(temp_local_file_path)
+
+
+class DownloadWorkerPool:
+    """
+    Drains a shared queue of DownloadTask objects with N worker threads.
+
+    Each worker opens its own SFTP channel on the transport of the given client,
+    so transfers run concurrently over a single authenticated SSH session.
+    With num_workers <= 1 tasks are downloaded inline on the given client.
+    """
+
+    def __init__(self, sftp_obj: paramiko.sftp_client.SFTPClient, num_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+                 on_task_done: Optional[Callable[[DownloadTask, bool], None]] = None):
+        self.sftp_obj = sftp_obj
+        self.num_workers = max(1, num_workers)
+        self.on_task_done = on_task_done
+        self.failed_tasks: List[DownloadTask] = []
+        self._queue: "queue.Queue[Optional[DownloadTask]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._stop_event = threading.Event()
+        self._failed_lock = threading.Lock()
+
+    def __enter__(self) -> "DownloadWorkerPool":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            # Interrupted or crashed: workers stop after their current file and
+            # we do not wait for them (they are daemon threads).
+            self._stop_event.set()
+            self.close(wait=False)
+        else:
+            self.close()
+
+    def start(self) -> None:
+        if self.num_workers <= 1:
+            return
+        transport = self.sftp_obj.get_channel().get_transport()
+        logging.info(f"Starting {self.num_workers} download workers on a shared SFTP transport.")
+        for worker_id in range(self.num_workers):
+            thread = threading.Thread(target=self._worker, args=(transport, worker_id),
+                                      name=f"sftp-worker-{worker_id}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, task: DownloadTask) -> None:
+        if not self._threads:
+            self._run_task(self.sftp_obj, task)
+        else:
+            self._queue.put(task)
+
+    def close(self, wait: bool = True) -> None:
+        """Shuts the workers down, by default after all queued tasks have finished."""
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def _run_task(self, sftp_obj: paramiko.sftp_client.SFTPClient, task: DownloadTask) -> None:
+        ok = download_file(sftp_obj, task)
+        if not ok:
+            with self._failed_lock:
+                self.failed_tasks.append(task)
+        if self.on_task_done:
+            self.on_task_done(task, ok)
+
+    def _worker(self, transport: paramiko.Transport, worker_id: int) -> None:
+        worker_sftp = None
+        try:
+            worker_sftp = paramiko.SFTPClient.from_transport(transport)
+        except Exception as e:
+            logging.error(f"Worker {worker_id}: could not open SFTP channel: {e}")
+
+        try:
+            while True:
+                task = self._queue.get()
+                if task is None:
+                    break
+                if self._stop_event.is_set():
+                    continue
+                # Fall back to the shared client if this worker has no channel of its own.
+                self._run_task(worker_sftp or self.sftp_obj, task)
+        finally:
+            if worker_sftp:
+                worker_sftp.close()
+
+class SlotTracker:
+    """
+    Reports a time slot once all of its requested files are available locally.
+
+    The callback receives the slot time and the local paths of its files (the
+    .DAT paths in decompress mode). It runs on whichever thread finished the
+    last file of the slot, so a blocking callback throttles the downloads.
+    """
+
+    def __init__(self, callback: Callable[[datetime, List[str]], None]):
+        self._callback = callback
+        self._lock = threading.Lock()
+        self._slot_of_path: Dict[str, datetime] = {}
+        self._pending: Dict[datetime, int] = {}
+        self._files: Dict[datetime, List[str]] = {}
+        self._failed: Set[datetime] = set()
+
+    @staticmethod
+    def _output_path(task: DownloadTask) -> str:
+        return task.decompressed_path or task.local_path
+
+    def add_slot(self, slot: datetime, tasks: List[DownloadTask], pending: List[DownloadTask]) -> None:
+        """
+        Registers a slot before its pending tasks are submitted.
+
+        :param slot: Time of the slot.
+        :param tasks: All tasks of the slot.
+        :param pending: The tasks that still have to be downloaded.
+        """
+        files = [self._output_path(task) for task in tasks]
+        if not pending:
+            self._callback(slot, files)
+            return
+        with self._lock:
+            self._pending[slot] = len(pending)
+            self._files[slot] = files
+            for task in pending:
+                self._slot_of_path[self._output_path(task)] = slot
+
+    def task_done(self, task: DownloadTask, ok: bool) -> None:
+        ready = None
+        with self._lock:
+            slot = self._slot_of_path.pop(self._output_path(task), None)
+            if slot is None:
+                return
+            if not ok:
+                self._failed.add(slot)
+            self._pending[slot] -= 1
+            if self._pending[slot] == 0:
+                del self._pending[slot]
+                files = self._files.pop(slot)
+                if slot in self._failed:
+                    self._failed.discard(slot)
+                    logging.warning(f"Slot {slot.strftime('%Y-%m-%d %H:%M')} is incomplete after failed downloads.")
+                else:
+                    ready = (slot, files)
+        if ready:
+            self._callback(*ready)
+
+def select_band_segments(bands: Set[str], bbox: Optional[BBox] = None) -> Dict[str, List[int]]:
+    """
+    Works out which full-disk segments to fetch for each band.
+
+    :param bands: Two-digit band numbers.
+    :param bbox: Region of interest, or None for the whole disk.
+    :return: A dictionary mapping each band to its sorted segment numbers.
+    """
+    all_segments = list(range(1, FLDK_SEGMENTS + 1))
+    if bbox is None:
+        return {band: all_segments for band in bands}
+
+    band_segments = {}
+    for band in bands:
+        resolution = AHI_BAND_RESOLUTION.get(band)
+        if resolution is None:
+            logging.warning(f"Unknown resolution for band {band}. Downloading all segments.")
+            band_segments[band] = all_segments
+            continue
+        band_segments[band] = sorted(segments_for_bbox(bbox, resolution))
+        logging.info(f"Band {band}: segments {band_segments[band]} intersect region {bbox}")
+    if not any(band_segments.values()):
+        logging.warning(f"Region {bbox} is not visible on the full disk. Nothing will be downloaded.")
+    return band_segments
+
+def slot_directories(time_dt: datetime, local_base_path: str) -> Tuple[str, str]:
+    """
+    Returns the remote hour directory and the local subdirectory for a time point.
+
+    :param time_dt: The time point.
+    :param local_base_path: The base directory for downloaded files.
+    :return: (remote_dir, local_subdir)
+    """
+    detail_time = extract_date_time_info(time_dt)
+    remote_dir = f'/jma/hsd/{detail_time['year_month']}/{detail_time['day']}/{detail_time['hour']}/'
+    local_subdir = os.path.join(local_base_path, detail_time['year_month']+detail_time["day"], detail_time['hour'])
+    return remote_dir, local_subdir
+
+def build_slot_tasks(time_dt: datetime,
+                     remote_dir: str,
+                     local_subdir: str,
+                     remote_files: Dict[str, RemoteFileAttr],
+                     hsd_index: HsdIndex,
+                     band_segments: Dict[str, List[int]],
+                     verify_mtime: bool = False,
+                     decompress_to: Optional[str] = None,
+                     keep_compressed: bool = True) -> List[DownloadTask]:
+    """
+    Creates the download tasks of one time slot from an indexed directory listing.
+
+    :param time_dt: The time point of the slot.
+    :param remote_dir: Remote hour directory containing the slot.
+    :param local_subdir: Local directory for the .bz2 files.
+    :param remote_files: Listing of remote_dir with sizes and mtimes.
+    :param hsd_index: Index of remote_dir built by build_hsd_index.
+    :param band_segments: Segments to fetch per two-digit band.
+    :return: One task per requested band/segment present on the server.
+    """
+    slot_tasks: List[DownloadTask] = []
+    timestamp = time_dt.strftime("%Y%m%d%H%M")
+    for band in sorted(band_segments):
+        for segment in band_segments[band]:
+            filename = hsd_index.get((timestamp, band, segment))
+            if filename is None:
+                continue
+
+            remote_file_path = remote_dir + filename
+            # Updated local file path to use the subdirectory
+            local_file_path = os.path.join(local_subdir, filename)
+
+            remote_attr = remote_files[filename]
+            decompressed_path = os.path.join(decompress_to, filename[:-len(".bz2")]) if decompress_to else None
+            logging.info(f"Found matching file: {filename} (Band {band})")
+            slot_tasks.append(DownloadTask(remote_file_path, local_file_path,
+                                           remote_attr.size, remote_attr.mtime, verify_mtime,
+                                           decompressed_path, keep_compressed))
+    return slot_tasks
+
+def pending_slot_tasks(slot_tasks: List[DownloadTask]) -> List[DownloadTask]:
+    """Filters out tasks whose local outputs are already complete."""
+    pending_tasks = []
+    for task in slot_tasks:
+        if task_is_complete(task):
+            logging.info(f"File already exists locally: {task.decompressed_path or task.local_path}. Skipping.")
+            continue
+        if os.path.exists(task.local_path) and not local_file_matches(task):
+            logging.warning(f"Local file {task.local_path} does not match the remote size/mtime. Re-queuing.")
+        pending_tasks.append(task)
+    return pending_tasks
+
 def download_data(sftp_obj: paramiko.sftp_client.SFTPClient,
                   time_points: List[datetime],
                   target_bands: Set[str],
-                  local_base_path: str = LOCAL_DATA_DIR) -> None:
+                  local_base_path: str = LOCAL_DATA_DIR,
+                  num_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+                  listing_cache: Optional[RemoteListingCache] = None,
+                  verify_mtime: bool = False,
+                  bbox: Optional[BBox] = None,
+                  decompress_to: Optional[str] = None,
+                  keep_compressed: bool = True,
+                  on_slot_ready: Optional[Callable[[datetime, List[str]], None]] = None) -> None:
     """
     Downloads satellite data files for specified time points and bands.
 
@@ -123,8 +762,17 @@ def download_data(sftp_obj: paramiko.sftp_client.SFTPClient,
     :param time_points: List of datetime objects to download data for.
     :param target_bands: Set of band numbers (as strings) to download.
     :param local_base_path: The base directory to save downloaded files locally.
+    :param num_workers: Number of parallel SFTP channels used for the transfers.
+    :param listing_cache: Cache of remote directory listings; an in-memory one is used if None.
+    :param verify_mtime: Also re-download local files whose mtime differs from the remote one.
+    :param bbox: Region of interest (lon_min, lon_max, lat_min, lat_max); only the full-disk
+                 segments intersecting it are downloaded. All segments if None.
+    :param decompress_to: If set, decompress while downloading and write the .DAT files to this directory.
+    :param keep_compressed: In decompress mode, also keep the .bz2 files under local_base_path.
+    :param on_slot_ready: Called with (slot time, local file paths) as soon as every requested
+                          band/segment of a time slot is available locally. Slots missing files
+                          on the server or with failed downloads are not reported.
     """
-    global current_temp_file_path
     # Removed os.makedirs(local_base_path, exist_ok=True) here as subdirs will handle it
 
     if not time_points:
@@ -133,121 +781,285 @@ def download_data(sftp_obj: paramiko.sftp_client.SFTPClient,
 
     logging.info(f"Starting download process for {len(time_points)} time points...")
 
-    for time_dt in time_points:
-        detail_time = extract_date_time_info(time_dt)
-        remote_dir = f'/jma/hsd/{detail_time['year_month']}/{detail_time['day']}/{detail_time['hour']}/'
-        target_minute = detail_time['minute']
+    if listing_cache is None:
+        listing_cache = RemoteListingCache()
+    # Accept "1" as well as "01"
+    bands = {band.zfill(2) for band in target_bands}
+    band_segments = select_band_segments(bands, bbox)
+    if decompress_to:
+        os.makedirs(decompress_to, exist_ok=True)
 
-        # Create local subdirectory based on year_month and hour
-        local_subdir = os.path.join(local_base_path, detail_time['year_month']+detail_time["day"], detail_time['hour'])
-        print(f"Creating local directory: {local_subdir}")
-        os.makedirs(local_subdir, exist_ok=True)  # Create directory if it doesn't exist
+    expected_files = sum(len(segments) for segments in band_segments.values())
+    slot_tracker = SlotTracker(on_slot_ready) if on_slot_ready else None
 
-        logging.info(f"Checking remote directory: {remote_dir} for time {time_dt.strftime('%Y-%m-%d %H:%M')}")
+    with DownloadWorkerPool(sftp_obj, num_workers,
+                            on_task_done=slot_tracker.task_done if slot_tracker else None) as pool:
+        for time_dt in time_points:
+            remote_dir, local_subdir = slot_directories(time_dt, local_base_path)
 
-        try:
-            files_in_dir = sftp_obj.listdir(remote_dir)
-        except FileNotFoundError:
-            logging.warning(f"Remote directory not found: {remote_dir}. Skipping this time slot.")
-            continue
-        except Exception as e:
-            logging.error(f"Error listing directory {remote_dir}: {e}")
-            continue
+            # Create local subdirectory based on year_month and hour
+            print(f"Creating local directory: {local_subdir}")
+            os.makedirs(local_subdir, exist_ok=True)  # Create directory if it doesn't exist
 
-        found_files_for_time = False
-        for filename in files_in_dir:
-            if not filename.endswith('.DAT.bz2') or '_FLDK_' not in filename:
-                continue
+            logging.info(f"Checking remote directory: {remote_dir} for time {time_dt.strftime('%Y-%m-%d %H:%M')}")
 
             try:
-                parts = filename.split('_')
-                if len(parts) < 5: continue
-
-                file_timestamp_str = parts[2] + parts[3]
-                file_band_part = ""
-                for part in parts:
-                    if part.startswith('B') and part[1:].isdigit():
-                        file_band_part = part
-                        break
-                    elif '.fldk.' in part.lower():
-                         sub_parts = part.split('.')
-                         if len(sub_parts) > 1 and sub_parts[-1].isdigit():
-                            file_band_part = f"B{sub_parts[-1].zfill(2)}"
-                            break
-                    elif 'FLDK' in part:
-                        sub_parts = part.split('.')
-                        if len(sub_parts) > 1 and sub_parts[-1].isdigit():
-                           file_band_part = f"B{sub_parts[-1].zfill(2)}"
-                           break
-                        elif len(sub_parts) > 1 and sub_parts[-1].startswith('B') and sub_parts[-1][1:].isdigit():
-                            file_band_part = sub_parts[-1]
-                            break
-
-                if not file_band_part:
-                    try:
-                        fldk_part = filename.split('FLDK.')[1].split('.')[0]
-                        if fldk_part.isdigit():
-                            file_band_part = f"B{fldk_part.zfill(2)}"
-                    except IndexError:
-                        pass
-
-                if not file_band_part:
-                    continue
+                hour_start = time_dt.replace(minute=0, second=0, microsecond=0)
+                remote_files = listing_cache.listdir(sftp_obj, remote_dir, hour_start)
+                hsd_index = listing_cache.index(sftp_obj, remote_dir, hour_start)
+            except FileNotFoundError:
+                logging.warning(f"Remote directory not found: {remote_dir}. Skipping this time slot.")
+                continue
+            except Exception as e:
+                logging.error(f"Error listing directory {remote_dir}: {e}")
+                continue
 
-                file_band_check = file_band_part[1:]
+            slot_tasks = build_slot_tasks(time_dt, remote_dir, local_subdir, remote_files, hsd_index,
+                                          band_segments, verify_mtime, decompress_to, keep_compressed)
+            pending_tasks = pending_slot_tasks(slot_tasks)
 
-                if file_timestamp_str != time_dt.strftime("%Y%m%d%H%M"):
-                     if len(parts) > 3 and parts[3][-2:] != target_minute:
-                        continue
+            if not slot_tasks:
+                logging.info(f"No matching files found for {time_dt.strftime('%Y-%m-%d %H:%M')} in {remote_dir} with target bands {target_bands}.")
+                continue
 
-                if file_band_check not in target_bands:
-                    continue
+            if slot_tracker:
+                if len(slot_tasks) == expected_files:
+                    slot_tracker.add_slot(time_dt, slot_tasks, pending_tasks)
+                else:
+                    logging.warning(f"Only {len(slot_tasks)} of {expected_files} requested files are available for "
+                                    f"{time_dt.strftime('%Y-%m-%d %H:%M')}. The slot will not be reported as complete.")
+            for task in pending_tasks:
+                pool.submit(task)
 
-                found_files_for_time = True
-                remote_file_path = os.path.join(remote_dir, filename).replace("\\", "/")
-                # Updated local file path to use the subdirectory
-                local_file_path = os.path.join(local_subdir, filename)
-                temp_local_file_path = local_file_path + ".part"
+    listing_cache.save()
+    if pool.failed_tasks:
+        logging.warning(f"{len(pool.failed_tasks)} file(s) failed to download.")
+    logging.info("Download process finished.")
 
-                logging.info(f"Found matching file: {filename} (Band {file_band_check})")
 
-                if os.path.exists(local_file_path):
-                    logging.info(f"File already exists locally: {local_file_path}. Skipping.")
-                    continue
-                if os.path.exists(temp_local_file_path):
-                    logging.warning(f"Partial file exists: {temp_local_file_path}. Attempting to resume/overwrite.")
-
-                logging.info(f"Downloading {remote_file_path} to {temp_local_file_path}")
-                try:
-                    current_temp_file_path = temp_local_file_path
-                    sftp_obj.get(remote_file_path, temp_local_file_path)
-                    os.rename(temp_local_file_path, local_file_path)
-                    logging.info(f"Successfully downloaded and saved: {local_file_path}")
-                    current_temp_file_path = None
-
-                except Exception as download_err:
-                    logging.error(f"Failed to download {remote_file_path}: {download_err}")
-                    if os.path.exists(temp_local_file_path):
+def watch_new_data(connect: Callable[[], Tuple[paramiko.Transport, paramiko.sftp_client.SFTPClient]],
+                   target_bands: Set[str],
+                   local_base_path: str = LOCAL_DATA_DIR,
+                   poll_interval: float = WATCH_POLL_INTERVAL,
+                   max_backoff: float = WATCH_MAX_BACKOFF,
+                   num_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+                   listing_cache: Optional[RemoteListingCache] = None,
+                   verify_mtime: bool = False,
+                   bbox: Optional[BBox] = None,
+                   decompress_to: Optional[str] = None,
+                   keep_compressed: bool = True,
+                   on_slot_ready: Optional[Callable[[datetime, List[str]], None]] = None,
+                   max_polls: Optional[int] = None) -> None:
+    """
+    Polls the current and previous (UTC) hour directories and downloads new files as they appear.
+
+    One connection is opened up front and reused for every poll; it is only
+    re-established after a failure. Failed polls are retried with exponential
+    backoff up to max_backoff seconds.
+
+    :param connect: Returns a new (transport, sftp client) pair, e.g. connect_sftp.
+    :param target_bands: Set of band numbers (as strings) to download.
+    :param local_base_path: The base directory to save downloaded files locally.
+    :param poll_interval: Seconds between polls in steady state.
+    :param max_backoff: Upper bound in seconds for the delay after consecutive failures.
+    :param on_slot_ready: Called once per time slot when all requested bands/segments are available locally.
+    :param max_polls: Stop after this many polls (runs until interrupted if None).
+    The other parameters are the same as for download_data.
+    """
+    if listing_cache is None:
+        listing_cache = RemoteListingCache()
+    bands = {band.zfill(2) for band in target_bands}
+    band_segments = select_band_segments(bands, bbox)
+    expected_files = sum(len(segments) for segments in band_segments.values())
+    if decompress_to:
+        os.makedirs(decompress_to, exist_ok=True)
+
+    # Remote paths already downloaded (or found complete locally), per remote hour directory.
+    # Paths are only added once their download succeeded, so failed tasks and tasks that never
+    # started (pool stopped by an error) are picked up again on the next poll.
+    seen_files: Dict[str, Set[str]] = {}
+    seen_lock = threading.Lock()
+    seen_set_of: Dict[str, Set[str]] = {}
+
+    def mark_downloaded(task: DownloadTask, ok: bool) -> None:
+        if ok:
+            with seen_lock:
+                seen_set_of.get(task.remote_path, set()).add(task.remote_path)
+    reported_slots: Set[datetime] = set()
+    transport, sftp_obj = None, None
+    delay = poll_interval
+    polls = 0
+
+    logging.info(f"Watching for new data every {poll_interval:.0f} s (bands {', '.join(sorted(bands))}).")
+    try:
+        while max_polls is None or polls < max_polls:
+            polls += 1
+            try:
+                if transport is None or not transport.is_active():
+                    if transport is not None:
+                        logging.warning("SFTP connection lost. Reconnecting.")
+                        transport.close()
+                    transport, sftp_obj = connect()
+
+                now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+                current_hour = now_utc.replace(minute=0, second=0, microsecond=0)
+                watched_hours = [current_hour - timedelta(hours=1), current_hour]
+                watched_dirs = set()
+                candidate_slots: Dict[datetime, List[DownloadTask]] = {}
+
+                with DownloadWorkerPool(sftp_obj, num_workers, on_task_done=mark_downloaded) as pool:
+                    for hour_start in watched_hours:
+                        remote_dir, local_subdir = slot_directories(hour_start, local_base_path)
+                        watched_dirs.add(remote_dir)
                         try:
-                            os.remove(temp_local_file_path)
-                            logging.info(f"Removed partial download file: {temp_local_file_path}")
-                        except OSError as remove_err:
-                            logging.error(f"Error removing partial file {temp_local_file_path}: {remove_err}")
-                    current_temp_file_path = None
-
-            except Exception as file_process_err:
-                logging.error(f"Error processing file {filename}: {file_process_err}")
-                continue
+                            remote_files = listing_cache.listdir(sftp_obj, remote_dir, hour_start, refresh=True)
+                        except FileNotFoundError:
+                            logging.debug(f"Remote directory not published yet: {remote_dir}")
+                            continue
+                        hsd_index = listing_cache.index(sftp_obj, remote_dir, hour_start)
+                        with seen_lock:
+                            seen = seen_files.setdefault(remote_dir, set())
 
-        if not found_files_for_time:
-            logging.info(f"No matching files found for {time_dt.strftime('%Y-%m-%d %H:%M')} in {remote_dir} with target bands {target_bands}.")
+                        for timestamp in sorted({key[0] for key in hsd_index}):
+                            time_dt = datetime.strptime(timestamp, "%Y%m%d%H%M")
+                            if time_dt in reported_slots:
+                                continue
+                            os.makedirs(local_subdir, exist_ok=True)
+                            slot_tasks = build_slot_tasks(time_dt, remote_dir, local_subdir, remote_files, hsd_index,
+                                                          band_segments, verify_mtime, decompress_to, keep_compressed)
+                            candidate_slots[time_dt] = slot_tasks
+                            with seen_lock:
+                                new_tasks = [task for task in slot_tasks if task.remote_path not in seen]
+                            if new_tasks:
+                                logging.info(f"{len(new_tasks)} new file(s) for {time_dt.strftime('%Y-%m-%d %H:%M')}")
+                            pending = pending_slot_tasks(new_tasks)
+                            pending_paths = {task.remote_path for task in pending}
+                            with seen_lock:
+                                seen.update(task.remote_path for task in new_tasks
+                                            if task.remote_path not in pending_paths)
+                                for task in pending:
+                                    seen_set_of[task.remote_path] = seen
+                            for task in pending:
+                                pool.submit(task)
 
-    logging.info("Download process finished.")
+                seen_set_of.clear()
+                # Forget hours that are no longer watched
+                for remote_dir in list(seen_files):
+                    if remote_dir not in watched_dirs:
+                        del seen_files[remote_dir]
+                reported_slots = {slot for slot in reported_slots if slot >= watched_hours[0]}
 
+                if on_slot_ready:
+                    for time_dt, slot_tasks in sorted(candidate_slots.items()):
+                        if (time_dt not in reported_slots and len(slot_tasks) == expected_files
+                                and all(task_is_complete(task) for task in slot_tasks)):
+                            reported_slots.add(time_dt)
+                            on_slot_ready(time_dt, [task.decompressed_path or task.local_path for task in slot_tasks])
+
+                listing_cache.save()
+                delay = poll_interval
+            except paramiko.AuthenticationException:
+                raise
+            except (paramiko.SSHException, OSError, EOFError) as e:
+                delay = min(delay * 2, max_backoff)
+                logging.error(f"Poll failed: {e}. Retrying in {delay:.0f} s.")
+            if max_polls is None or polls < max_polls:
+                time.sleep(delay)
+    finally:
+        if sftp_obj:
+            sftp_obj.close()
+        if transport and transport.is_active():
+            transport.close()
+
+
+def connect_sftp() -> Tuple[paramiko.Transport, paramiko.sftp_client.SFTPClient]:
+    """Opens an authenticated SSH transport and an SFTP client on it."""
+    logging.info(f"Connecting to SFTP server: {FTP_HOST}:{FTP_PORT}")
+    transport = paramiko.Transport((FTP_HOST, FTP_PORT))
+    try:
+        transport.connect(username=FTP_USER, password=FTP_PASS)
+        sftp = paramiko.SFTPClient.from_transport(transport)
+    except Exception:
+        transport.close()
+        raise
+    logging.info("SFTP connection successful.")
+    return transport, sftp
+
+def _datetime_arg(text: str) -> datetime:
+    try:
+        return datetime.strptime(text, "%Y%m%d%H%M")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYYMMDDHHMM, got {text!r}")
+
+def _bands_arg(text: str) -> Set[str]:
+    bands = {band.strip() for band in text.split(',') if band.strip().isdigit()}
+    if not bands:
+        raise argparse.ArgumentTypeError(f"no valid band numbers in {text!r}")
+    return bands
+
+def _bbox_arg(text: str) -> BBox:
+    try:
+        return parse_bbox(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def build_arg_parser(add_help: bool = True) -> argparse.ArgumentParser:
+    """Builds the parser for the download options (also reused by pipeline.py)."""
+    parser = argparse.ArgumentParser(description="Download Himawari HSD full-disk data via SFTP.", add_help=add_help)
+    parser.add_argument("--start", type=_datetime_arg,
+                        help="Start time YYYYMMDDHHMM (UTC); asked for interactively if omitted")
+    parser.add_argument("--end", type=_datetime_arg,
+                        help="End time YYYYMMDDHHMM (UTC); asked for interactively if omitted")
+    parser.add_argument("--bands", type=_bands_arg,
+                        help="Comma separated bands, e.g. 01,03,08; asked for interactively if omitted")
+    parser.add_argument("--workers", type=int, default=DEFAULT_DOWNLOAD_WORKERS,
+                        help=f"Number of parallel SFTP channels (default: {DEFAULT_DOWNLOAD_WORKERS}, 1 = sequential)")
+    parser.add_argument("--listing-cache", default=LISTING_CACHE_FILE,
+                        help=f"File used to persist listings of closed past hours (default: {LISTING_CACHE_FILE})")
+    parser.add_argument("--listing-ttl", type=float, default=LISTING_CACHE_TTL_HOURS,
+                        help=f"Hours a persisted listing stays valid (default: {LISTING_CACHE_TTL_HOURS})")
+    parser.add_argument("--no-listing-cache", action="store_true",
+                        help="Do not read or write the persisted listing cache")
+    region_group = parser.add_mutually_exclusive_group()
+    region_group.add_argument("--bbox", type=_bbox_arg,
+                              help="Only download segments intersecting lon_min,lon_max,lat_min,lat_max")
+    region_group.add_argument("--region", type=_bbox_arg, dest="bbox",
+                              help=f"Only download segments intersecting a named region ({', '.join(NAMED_REGIONS)})")
+    parser.add_argument("--decompress", action="store_true",
+                        help="Decompress while downloading and write .DAT files ready for Satpy")
+    parser.add_argument("--decompressed-dir", default=DECOMPRESSED_DATA_DIR,
+                        help=f"Output directory for --decompress (default: {DECOMPRESSED_DATA_DIR})")
+    parser.add_argument("--no-keep-bz2", action="store_true",
+                        help="With --decompress, do not keep the .bz2 files")
+    parser.add_argument("--verify-mtime", action="store_true",
+                        help="Also re-download local files whose modification time differs from the server")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and download newly published files of the current and previous hour")
+    parser.add_argument("--poll-interval", type=float, default=WATCH_POLL_INTERVAL,
+                        help=f"Seconds between polls in --watch mode (default: {WATCH_POLL_INTERVAL:.0f})")
+    parser.add_argument("--max-backoff", type=float, default=WATCH_MAX_BACKOFF,
+                        help=f"Maximum retry delay in seconds after failed polls (default: {WATCH_MAX_BACKOFF:.0f})")
+    return parser
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parses command line options. Anything not given is asked for interactively."""
+    return build_arg_parser().parse_args(argv)
+
+def download_options(args: argparse.Namespace) -> Dict:
+    """Turns parsed command line options into keyword arguments for download_data."""
+    return {
+        "num_workers": args.workers,
+        "listing_cache": RemoteListingCache(None if args.no_listing_cache else args.listing_cache,
+                                            ttl_hours=args.listing_ttl),
+        "verify_mtime": args.verify_mtime,
+        "bbox": args.bbox,
+        "decompress_to": args.decompressed_dir if args.decompress else None,
+        "keep_compressed": not args.no_keep_bz2,
+    }
 
 def main():
     """Main function to orchestrate the connection and download."""
-    global current_temp_file_path
+    args = parse_args()
 
     if FTP_HOST == "replace_with_host":
          logging.error("FTP credentials are not configured. Please edit the script or create config.py.")
@@ -255,32 +1067,39 @@ def main():
 
     logging.info("--- Satellite Data Downloader ---")
 
-    # Get date range from user
-    start_dt = get_datetime_input("Enter start date and time")
-    end_dt = get_datetime_input("Enter end date and time")
+    if args.watch:
+        # Watch mode runs unattended, so fall back to the defaults instead of prompting
+        selected_bands = args.bands or DEFAULT_TARGET_BANDS
+        time_points_to_download = []
+    else:
+        # Get date range from user
+        start_dt = args.start or get_datetime_input("Enter start date and time")
+        end_dt = args.end or get_datetime_input("Enter end date and time")
 
-    # Get target bands from user
-    selected_bands = get_band_input(DEFAULT_TARGET_BANDS)
+        # Get target bands from user
+        selected_bands = args.bands or get_band_input(DEFAULT_TARGET_BANDS)
 
-    # Generate time points
-    time_points_to_download = generate_time_range(start_dt, end_dt)
+        # Generate time points
+        time_points_to_download = generate_time_range(start_dt, end_dt)
 
-    if not time_points_to_download:
-        logging.info("No time points to process. Exiting.")
-        sys.exit(0)
+        if not time_points_to_download:
+            logging.info("No time points to process. Exiting.")
+            sys.exit(0)
 
     # Establish SFTP Connection
     transport = None
     sftp = None
     try:
-        logging.info(f"Connecting to SFTP server: {FTP_HOST}:{FTP_PORT}")
-        transport = paramiko.Transport((FTP_HOST, FTP_PORT))
-        transport.connect(username=FTP_USER, password=FTP_PASS)
-        sftp = paramiko.SFTPClient.from_transport(transport)
-        logging.info("SFTP connection successful.")
+        if args.watch:
+            # The watcher owns (and re-establishes) its connection
+            watch_new_data(connect_sftp, selected_bands, LOCAL_DATA_DIR,
+                           args.poll_interval, args.max_backoff, **download_options(args))
+        else:
+            transport, sftp = connect_sftp()
 
-        # Start download process
-        download_data(sftp, time_points_to_download, selected_bands, LOCAL_DATA_DIR)
+            # Start download process
+            download_data(sftp, time_points_to_download, selected_bands, LOCAL_DATA_DIR,
+                          **download_options(args))
 
     except paramiko.AuthenticationException:
         logging.error("Authentication failed. Please check FTP_USER and FTP_PASS.")
@@ -291,16 +1110,14 @@ def main():
         logging.error(f"A required directory or file not found: {fnf_err}")
     except KeyboardInterrupt:
         logging.warning("\n--- Process interrupted by user (Ctrl+C) ---")
-        # Cleanup partial download if interruption happened during sftp.get()
-        if current_temp_file_path and os.path.exists(current_temp_file_path):
-            logging.info(f"Cleaning up partial download: {current_temp_file_path}")
-            try:
-                os.remove(current_temp_file_path)
-                logging.info("Partial file removed.")
-            except OSError as e:
-                logging.error(f"Could not remove partial file {current_temp_file_path}: {e}")
+        # Partial downloads are kept so the next run resumes them
+        with _temp_file_lock:
+            partial_files = [path for path in active_temp_file_paths if os.path.exists(path)]
+        if partial_files:
+            for temp_file_path in partial_files:
+                logging.info(f"Keeping partial download for resume: {temp_file_path}")
         else:
-            logging.info("No partial file to clean up.")
+            logging.info("No partial file in progress.")
         sys.exit(1) # Indicate script was interrupted
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}", exc_info=True) # Log traceback
@@ -312,7 +1129,8 @@ def main():
         if transport and transport.is_active():
             transport.close()
         logging.info("Connection closed.")
-        current_temp_file_path = None # Ensure tracker is cleared on exit
+        with _temp_file_lock:
+            active_temp_file_paths.clear() # Ensure tracker is cleared on exit
 
     logging.info("--- Script finished ---")
     sys.exit(0) # Indicate successful completion
@@ -0,0 +1,95 @@
+# 跨进程文件锁：同一个输出文件同一时间只由一个进程（或线程）生成
+
+import contextlib
+import os
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            # LK_LOCK 自己会重试 10 次（每次间隔 1 秒），仍失败则抛出 OSError
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _try_lock(fd: int) -> bool:
+    ''' 非阻塞地获取独占锁，已被其他持有者锁住时返回 False。'''
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def file_lock(lock_path: Path):
+    """
+    获取 lock_path 上的独占锁，阻塞直到获得，释放时删除锁文件。
+    POSIX 使用 fcntl.flock（每次打开各自持锁，同一进程的不同线程之间也互斥），
+    Windows 使用 msvcrt.locking。
+    """
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _lock(fd)
+        except BaseException:
+            os.close(fd)
+            raise
+        # 等待期间上一个持有者可能已删除锁文件，此时锁住的是已删除的文件，需要重新打开
+        try:
+            if os.path.samestat(os.fstat(fd), os.stat(lock_path)):
+                break
+        except FileNotFoundError:
+            pass
+        _unlock(fd)
+        os.close(fd)
+
+    try:
+        yield
+    finally:
+        # 持锁时删除，等待者醒来后会发现文件已不同并重试（Windows 上文件打开时无法删除，保留即可）
+        with contextlib.suppress(OSError):
+            os.unlink(lock_path)
+        _unlock(fd)
+        os.close(fd)
+
+
+def is_locked(lock_path: Path) -> bool:
+    """
+    lock_path 当前是否被某个进程（或本进程的其他打开）持有。文件不存在时返回 False。
+    只做探测：获得锁后立即释放，不创建也不删除文件。
+    """
+    try:
+        fd = os.open(lock_path, os.O_RDWR)
+    except FileNotFoundError:
+        return False
+    try:
+        if not _try_lock(fd):
+            return True
+        _unlock(fd)
+        return False
+    finally:
+        os.close(fd)
+
@@ -0,0 +1,435 @@
+"""
+Lightweight reader for decompressed Himawari Standard Data (.DAT) files.
+
+The header blocks are parsed into structured NumPy arrays and the count data is
+exposed as a read-only np.memmap, so reading a segment costs one small header
+read and no copy. Segments of a band can be stitched into a full-disk array.
+"""
+import argparse
+import functools
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from hsd_utils import parse_hsd_filename
+
+# --- Header block layouts (HSD format, blocks 1 to 7) ---
+BASIC_INFO_DTYPE = np.dtype([
+    ("hblock_number", "u1"),
+    ("blocklength", "<u2"),
+    ("total_number_of_hblocks", "<u2"),
+    ("byte_order", "u1"),
+    ("satellite", "S16"),
+    ("proc_center_name", "S16"),
+    ("observation_area", "S4"),
+    ("other_observation_info", "S2"),
+    ("observation_timeline", "<u2"),
+    ("observation_start_time", "<f8"),    # Modified Julian Date
+    ("observation_end_time", "<f8"),
+    ("file_creation_time", "<f8"),
+    ("total_header_length", "<u4"),
+    ("total_data_length", "<u4"),
+    ("quality_flags", "u1", (4,)),
+    ("file_format_version", "S32"),
+    ("file_name", "S128"),
+    ("spare", "S40"),
+])
+
+DATA_INFO_DTYPE = np.dtype([
+    ("hblock_number", "u1"),
+    ("blocklength", "<u2"),
+    ("number_of_bits_per_pixel", "<u2"),
+    ("number_of_columns", "<u2"),
+    ("number_of_lines", "<u2"),
+    ("compression_flag_for_data", "u1"),
+    ("spare", "S40"),
+])
+
+PROJ_INFO_DTYPE = np.dtype([
+    ("hblock_number", "u1"),
+    ("blocklength", "<u2"),
+    ("sub_lon", "<f8"),
+    ("CFAC", "<u4"),
+    ("LFAC", "<u4"),
+    ("COFF", "<f4"),
+    ("LOFF", "<f4"),
+    ("distance_from_earth_center", "<f8"),
+    ("earth_equatorial_radius", "<f8"),
+    ("earth_polar_radius", "<f8"),
+    ("req2_rpol2_req2", "<f8"),
+    ("rpol2_req2", "<f8"),
+    ("req2_rpol2", "<f8"),
+    ("coeff_for_sd", "<f8"),
+    ("resampling_types", "<i2"),
+    ("resampling_size", "<i2"),
+    ("spare", "S40"),
+])
+
+# Common part of the calibration block; followed by the VIS or IR coefficients
+CAL_INFO_DTYPE = np.dtype([
+    ("hblock_number", "u1"),
+    ("blocklength", "<u2"),
+    ("band_number", "<u2"),
+    ("central_wave_length", "<f8"),       # micrometres
+    ("valid_number_of_bits_per_pixel", "<u2"),
+    ("count_value_error_pixels", "<u2"),
+    ("count_value_outside_scan_pixels", "<u2"),
+    ("gain_count2rad_conversion", "<f8"),
+    ("offset_count2rad_conversion", "<f8"),
+])
+
+# Bands 7 to 16
+IRCAL_INFO_DTYPE = np.dtype([
+    ("c0_rad2tb_conversion", "<f8"),
+    ("c1_rad2tb_conversion", "<f8"),
+    ("c2_rad2tb_conversion", "<f8"),
+    ("c0_tb2rad_conversion", "<f8"),
+    ("c1_tb2rad_conversion", "<f8"),
+    ("c2_tb2rad_conversion", "<f8"),
+    ("speed_of_light", "<f8"),
+    ("planck_constant", "<f8"),
+    ("boltzmann_constant", "<f8"),
+    ("spare", "S40"),
+])
+
+# Bands 1 to 6
+VISCAL_INFO_DTYPE = np.dtype([
+    ("coeff_rad2albedo_conversion", "<f8"),
+    ("coeff_update_time", "<f8"),
+    ("cali_gain_count2rad_conversion", "<f8"),
+    ("cali_offset_count2rad_conversion", "<f8"),
+    ("spare", "S80"),
+])
+
+SEGMENT_INFO_DTYPE = np.dtype([
+    ("hblock_number", "u1"),
+    ("blocklength", "<u2"),
+    ("total_number_of_segments", "u1"),
+    ("segment_sequence_number", "u1"),
+    ("first_line_number_of_image_segment", "<u2"),
+    ("spare", "S40"),
+])
+
+# Header block number -> layout parsed by HsdSegment
+_BLOCK_DTYPES = {1: BASIC_INFO_DTYPE, 2: DATA_INFO_DTYPE, 3: PROJ_INFO_DTYPE,
+                 5: CAL_INFO_DTYPE, 7: SEGMENT_INFO_DTYPE}
+# Blocks 1 to 7 have a two-byte length; later blocks may not, so parsing stops here
+_LAST_PARSED_BLOCK = 7
+
+VIS_BANDS = range(1, 7)
+MJD_EPOCH = datetime(1858, 11, 17)
+
+
+class HsdSegment:
+    """
+    One decompressed HSD segment file.
+
+    :ivar counts: Read-only np.memmap of the raw counts, shape (lines, columns).
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        """
+        Reads and parses the header blocks of a .DAT file and maps its data.
+
+        :param path: Path of the decompressed .DAT file.
+        :raises ValueError: If the file is not a little-endian, uncompressed 16-bit HSD file.
+        """
+        self.path = os.fspath(path)
+        with open(self.path, "rb") as f:
+            head = f.read(BASIC_INFO_DTYPE.itemsize)
+            if len(head) < BASIC_INFO_DTYPE.itemsize:
+                raise ValueError(f"{self.path}: too short for an HSD file")
+            self.basic_info = np.frombuffer(head, BASIC_INFO_DTYPE)[0]
+            header_length = int(self.basic_info["total_header_length"])
+            header = head + f.read(header_length - len(head))
+
+        if self.basic_info["hblock_number"] != 1 or self.basic_info["byte_order"] != 0:
+            raise ValueError(f"{self.path}: not a little-endian HSD file")
+
+        blocks = {}
+        offset = 0
+        while offset < header_length:
+            block_number = header[offset]
+            if block_number > _LAST_PARSED_BLOCK:
+                break
+            block_length = int.from_bytes(header[offset + 1:offset + 3], "little")
+            if block_number in _BLOCK_DTYPES:
+                blocks[block_number] = np.frombuffer(header, _BLOCK_DTYPES[block_number], 1, offset)[0]
+            if block_number == 5:
+                extra_dtype = VISCAL_INFO_DTYPE if blocks[5]["band_number"] in VIS_BANDS else IRCAL_INFO_DTYPE
+                self.band_cal_info = np.frombuffer(header, extra_dtype, 1, offset + CAL_INFO_DTYPE.itemsize)[0]
+            offset += block_length
+        missing = set(_BLOCK_DTYPES) - set(blocks)
+        if missing:
+            raise ValueError(f"{self.path}: missing header blocks {sorted(missing)}")
+
+        self.data_info = blocks[2]
+        self.proj_info = blocks[3]
+        self.cal_info = blocks[5]
+        self.segment_info = blocks[7]
+        if self.data_info["number_of_bits_per_pixel"] != 16 or self.data_info["compression_flag_for_data"] != 0:
+            raise ValueError(f"{self.path}: only uncompressed 16-bit data is supported")
+
+        self.counts = np.memmap(self.path, dtype="<u2", mode="r", offset=header_length,
+                                shape=(self.lines, self.columns))
+
+    @property
+    def band(self) -> int:
+        return int(self.cal_info["band_number"])
+
+    @property
+    def lines(self) -> int:
+        return int(self.data_info["number_of_lines"])
+
+    @property
+    def columns(self) -> int:
+        return int(self.data_info["number_of_columns"])
+
+    @property
+    def segment(self) -> int:
+        return int(self.segment_info["segment_sequence_number"])
+
+    @property
+    def total_segments(self) -> int:
+        return int(self.segment_info["total_number_of_segments"])
+
+    @property
+    def first_line(self) -> int:
+        """1-based line of the full disk where this segment starts."""
+        return int(self.segment_info["first_line_number_of_image_segment"])
+
+    @property
+    def start_time(self) -> datetime:
+        return MJD_EPOCH + timedelta(days=float(self.basic_info["observation_start_time"]))
+
+    def calibration_key(self) -> "CalibrationKey":
+        """
+        The calibration coefficients of this segment. Visible bands use the updated
+        coefficients when the file provides them, as Satpy does by default.
+        """
+        gain = float(self.cal_info["gain_count2rad_conversion"])
+        offset = float(self.cal_info["offset_count2rad_conversion"])
+        cal = self.band_cal_info
+        if self.band in VIS_BANDS:
+            if cal["cali_gain_count2rad_conversion"] != 0 or cal["cali_offset_count2rad_conversion"] != 0:
+                gain = float(cal["cali_gain_count2rad_conversion"])
+                offset = float(cal["cali_offset_count2rad_conversion"])
+            coefficients = (float(cal["coeff_rad2albedo_conversion"]),)
+        else:
+            coefficients = tuple(float(cal[name]) for name in IR_COEFFICIENT_NAMES)
+        return CalibrationKey(
+            band=self.band,
+            gain=gain,
+            offset=offset,
+            error_count=int(self.cal_info["count_value_error_pixels"]),
+            outside_scan_count=int(self.cal_info["count_value_outside_scan_pixels"]),
+            wavelength=float(self.cal_info["central_wave_length"]),
+            coefficients=coefficients,
+        )
+
+    def calibrate(self, counts=None):
+        """
+        Converts counts to reflectance (%, bands 1-6) or brightness temperature (K, bands 7-16)
+        through the cached lookup table of this segment's calibration block.
+
+        :param counts: NumPy or Dask array of counts; defaults to the whole segment.
+        :return: float32 array of the same shape, NaN for error and outside-scan pixels.
+        """
+        return apply_calibration(self.counts if counts is None else counts,
+                                 calibration_lut(self.calibration_key()))
+
+
+# Names of the IR calibration coefficients stored in CalibrationKey.coefficients, in order
+IR_COEFFICIENT_NAMES = ("c0_rad2tb_conversion", "c1_rad2tb_conversion", "c2_rad2tb_conversion",
+                        "speed_of_light", "planck_constant", "boltzmann_constant")
+
+# One entry per possible 16-bit count
+LUT_SIZE = 65536
+
+
+class CalibrationKey(NamedTuple):
+    """Everything the count to reflectance/brightness temperature conversion of a band depends on."""
+    band: int
+    gain: float                     # count -> radiance
+    offset: float
+    error_count: int
+    outside_scan_count: int
+    wavelength: float               # micrometres
+    coefficients: Tuple[float, ...]  # VIS: (rad2albedo,); IR: values of IR_COEFFICIENT_NAMES
+
+
+@functools.lru_cache(maxsize=64)
+def calibration_lut(key: CalibrationKey) -> np.ndarray:
+    """
+    Builds the lookup table mapping every 16-bit count to its calibrated value.
+
+    The table depends only on the calibration coefficients, which rarely change
+    between slots, so it is cached and reused.
+
+    :return: Read-only float32 array of LUT_SIZE entries, NaN for error and outside-scan counts.
+    """
+    radiance = np.arange(LUT_SIZE, dtype=np.float32) * np.float32(key.gain) + np.float32(key.offset)
+    if key.band in VIS_BANDS:
+        lut = np.maximum(radiance * np.float32(key.coefficients[0] * 100.0), 0)
+    else:
+        lut = _brightness_temperature(radiance, key)
+    lut[[key.error_count, key.outside_scan_count]] = np.nan
+    lut.flags.writeable = False
+    return lut
+
+
+def _brightness_temperature(radiance: np.ndarray, key: CalibrationKey) -> np.ndarray:
+    """Inverse Planck function followed by the band's polynomial correction."""
+    c0, c1, c2, c, h, k = key.coefficients
+    wavelength = key.wavelength * 1e-6  # m
+    # radiance is per micrometre, the Planck function per metre; no radiance means no temperature
+    spectral = np.where(radiance > 0, radiance, np.nan).astype(np.float64) * 1e6
+    with np.errstate(invalid="ignore"):
+        effective = (h * c / (k * wavelength)) / np.log(2 * h * c ** 2 / (wavelength ** 5 * spectral) + 1)
+    tb = c0 + c1 * effective + c2 * effective ** 2
+    return np.maximum(tb, 0).astype(np.float32)
+
+
+def _take(lut: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    if counts.dtype.kind != "f":
+        return np.take(lut, counts)
+    # Satpy loads counts as floats with NaN for invalid pixels
+    invalid = np.isnan(counts)
+    result = np.take(lut, np.where(invalid, 0, counts).astype(np.uint16))
+    result[invalid] = np.nan
+    return result
+
+
+def apply_calibration(counts, lut: np.ndarray):
+    """
+    Calibrates counts with a single np.take per array (or per chunk, lazily, for Dask arrays).
+
+    :param counts: NumPy or Dask array of counts: uint16 as read from the file, or floats with
+        NaN for invalid pixels as loaded by Satpy with calibration="counts".
+    :param lut: Table from calibration_lut.
+    """
+    if hasattr(counts, "map_blocks"):
+        return counts.map_blocks(functools.partial(_take, lut), dtype=lut.dtype)
+    return _take(lut, counts)
+
+
+def open_segments(paths: Iterable[Union[str, os.PathLike]]) -> Dict[str, List[HsdSegment]]:
+    """
+    Opens segment files and groups them by band.
+
+    :param paths: Paths of decompressed .DAT files, possibly of several bands.
+    :return: A dictionary mapping "B01".."B16" to the band's segments, ordered by segment number.
+    """
+    bands: Dict[str, List[HsdSegment]] = defaultdict(list)
+    for path in paths:
+        segment = HsdSegment(path)
+        bands[f"B{segment.band:02d}"].append(segment)
+    for segments in bands.values():
+        segments.sort(key=lambda segment: segment.segment)
+    return dict(bands)
+
+
+def full_disk_shape(segments: Sequence[HsdSegment]) -> Tuple[int, int]:
+    """Shape of the full-disk image the segments belong to."""
+    first = segments[0]
+    return first.lines * first.total_segments, first.columns
+
+
+def stitch_segments(segments: Sequence[HsdSegment], calibrate: bool = True,
+                    window: Optional[Tuple[slice, slice]] = None) -> np.ndarray:
+    """
+    Stitches the segments of one band into a full-disk array.
+
+    Lines of segments that are not given are NaN (calibrated) or the
+    outside-scan count (raw counts).
+
+    :param segments: Segments of a single band and observation.
+    :param calibrate: Return calibrated float32 values instead of raw uint16 counts.
+    :param window: (line slice, column slice) of the full disk to read instead of the whole disk;
+        only the counts inside it are read and calibrated.
+    :return: Array of full_disk_shape(segments), or of the window's shape.
+    """
+    first = segments[0]
+    full_shape = full_disk_shape(segments)
+    lines, columns = window or (slice(None), slice(None))
+    line_start, line_stop, _ = lines.indices(full_shape[0])
+    columns = slice(*columns.indices(full_shape[1])[:2])
+    shape = (max(line_stop - line_start, 0), max(columns.stop - columns.start, 0))
+    if calibrate:
+        result = np.full(shape, np.nan, dtype=np.float32)
+    else:
+        result = np.full(shape, first.cal_info["count_value_outside_scan_pixels"], dtype=np.uint16)
+    for segment in segments:
+        start = max(segment.first_line - 1, line_start)
+        stop = min(segment.first_line - 1 + segment.lines, line_stop)
+        if start >= stop:
+            continue
+        offset = segment.first_line - 1
+        counts = segment.counts[start - offset:stop - offset, columns]
+        result[start - line_start:stop - line_start] = segment.calibrate(counts) if calibrate else counts
+    return result
+
+
+def resample_nearest(data: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Resamples a full-disk array (or a window aligned to both grids) to another AHI grid by an integer factor.
+
+    Coarser grids take every n-th pixel (a strided view, no copy); finer grids repeat pixels.
+    """
+    if data.shape == shape:
+        return data
+    if data.shape[0] > shape[0]:
+        step = data.shape[0] // shape[0]
+        return data[::step, ::step]
+    factor = shape[0] // data.shape[0]
+    return np.repeat(np.repeat(data, factor, axis=0), factor, axis=1)
+
+
+def _print_summary(bands: Dict[str, List[HsdSegment]], calibrate: bool):
+    for band, segments in sorted(bands.items()):
+        first = segments[0]
+        start = time.perf_counter()
+        data = stitch_segments(segments, calibrate)
+        elapsed = time.perf_counter() - start
+        unit = "counts" if not calibrate else "%" if first.band in VIS_BANDS else "K"
+        print(f"{band}  {first.start_time:%Y-%m-%d %H:%M}  segments "
+              f"{','.join(str(segment.segment) for segment in segments)}/{first.total_segments}  "
+              f"shape {data.shape[0]}x{data.shape[1]}  "
+              f"min {np.nanmin(data):.2f}  max {np.nanmax(data):.2f} {unit}  read {elapsed:.2f}s")
+
+
+def main():
+    """Prints a summary of HSD files and optionally saves a stitched band as .npy."""
+    parser = argparse.ArgumentParser(description="Read decompressed Himawari Standard Data (.DAT) files.")
+    parser.add_argument("files", nargs="+", help="Decompressed .DAT segment files")
+    parser.add_argument("--counts", action="store_true", help="Use raw counts instead of calibrated values")
+    parser.add_argument("--save", metavar="BAND=FILE.npy", action="append", default=[],
+                        help="Save the stitched full disk of a band, e.g. B13=b13.npy (repeatable)")
+    args = parser.parse_args()
+
+    paths = []
+    for path in args.files:
+        info = parse_hsd_filename(os.path.basename(path))
+        if info is not None and not info.compressed:
+            paths.append(path)
+    skipped = len(args.files) - len(paths)
+    if skipped:
+        print(f"Skipping {skipped} files that are not HSD .DAT files.", file=sys.stderr)
+    bands = open_segments(paths)
+    _print_summary(bands, not args.counts)
+
+    for item in args.save:
+        band, _, output = item.partition("=")
+        if band not in bands or not output:
+            parser.error(f"--save expects BAND=FILE.npy for one of {', '.join(sorted(bands))}, got {item!r}")
+        np.save(output, stitch_segments(bands[band], not args.counts))
+        print(f"Saved {band} to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Helpers for Himawari Standard Data (HSD) files shared by download.py and objective_main.py.
+"""
+import math
+import os
+import re
+import struct
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, TypeVar, Union
+
+# e.g. HS_H09_20231001_0000_B01_FLDK_R10_S0110.DAT.bz2
+HSD_FILENAME_PATTERN = re.compile(
+    r"HS_(?P<satellite>H\d{2})_(?P<date>\d{8})_(?P<time>\d{4})_B(?P<band>\d{2})_"
+    r"(?P<area>FLDK|JP\d{2}|R\d{3})_R(?P<resolution>\d{2})_"
+    r"S(?P<segment>\d{2})(?P<total_segments>\d{2})\.DAT(?P<compressed>\.bz2)?$"
+)
+
+# Number of latitude segments a full-disk (FLDK) band is split into
+FLDK_SEGMENTS = 10
+
+
+class HsdFileInfo(NamedTuple):
+    """Fields encoded in an HSD file name."""
+    satellite: str      # e.g. "H09"
+    timestamp: str      # observation start, "YYYYMMDDHHMM"
+    band: str           # two digits, e.g. "03"
+    area: str           # "FLDK", "JP01".."JP04" or "R301".."R305"
+    resolution: str     # "05", "10" or "20" (0.5, 1 and 2 km)
+    segment: int
+    total_segments: int
+    compressed: bool
+
+
+# (timestamp, band, segment) -> file name
+HsdIndex = Dict[Tuple[str, str, int], str]
+
+
+def parse_hsd_filename(filename: str) -> Optional[HsdFileInfo]:
+    """
+    Parses an HSD file name.
+
+    :param filename: Base name of the file, with or without the .bz2 suffix.
+    :return: The parsed fields, or None if the name is not an HSD file name.
+    """
+    match = HSD_FILENAME_PATTERN.match(filename)
+    if not match:
+        return None
+    return HsdFileInfo(
+        satellite=match['satellite'],
+        timestamp=match['date'] + match['time'],
+        band=match['band'],
+        area=match['area'],
+        resolution=match['resolution'],
+        segment=int(match['segment']),
+        total_segments=int(match['total_segments']),
+        compressed=match['compressed'] is not None,
+    )
+
+
+def build_hsd_index(filenames: Iterable[str], area: str = "FLDK", compressed: bool = True) -> HsdIndex:
+    """
+    Indexes a directory listing by (timestamp, band, segment) in a single pass.
+
+    :param filenames: File names as returned by a directory listing.
+    :param area: Observation area to keep.
+    :param compressed: Keep only .DAT.bz2 files if True, only .DAT files if False.
+    :return: A dictionary mapping (timestamp, band, segment) to the file name.
+    """
+    index: HsdIndex = {}
+    for filename in filenames:
+        info = parse_hsd_filename(filename)
+        if info is None or info.area != area or info.compressed != compressed:
+            continue
+        index[(info.timestamp, info.band, info.segment)] = filename
+    return index
+
+
+# --- Header blocks (HSD format, blocks 1 and 2) ---
+BASIC_INFO_BLOCK_LENGTH = 282
+DATA_INFO_BLOCK_LENGTH = 50
+# Offset of the total header length and total data length in block 1
+_HEADER_LENGTHS_OFFSET = 70
+# Bytes needed for validation: block 1 plus the start of block 2 up to the number of lines
+_VALIDATION_READ_SIZE = BASIC_INFO_BLOCK_LENGTH + 9
+
+
+def validate_hsd_file(path: Union[str, os.PathLike]) -> Optional[str]:
+    """
+    Checks that a decompressed HSD file is structurally complete.
+
+    Only the first two header blocks are read: the total header length and data
+    length declared in block 1 must add up to the file size, and the data length
+    must match the image size declared in block 2. This catches files truncated by
+    an interrupted decompression without opening them in Satpy.
+
+    :param path: Path of the .DAT file.
+    :return: None if the file looks complete, otherwise a description of the problem.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_VALIDATION_READ_SIZE)
+            file_size = os.fstat(f.fileno()).st_size
+    except OSError as e:
+        return f"unreadable: {e}"
+    if len(header) < _VALIDATION_READ_SIZE:
+        return f"file is only {file_size} bytes long"
+
+    # Block 1 starts with block number (u1), block length (u2), number of header blocks (u2)
+    # and the byte order flag (u1: 0 little endian, 1 big endian)
+    endian = ">" if header[5] == 1 else "<"
+    block_number, block_length = struct.unpack_from(endian + "BH", header)
+    if block_number != 1 or block_length != BASIC_INFO_BLOCK_LENGTH:
+        return "missing basic information block"
+    header_length, data_length = struct.unpack_from(endian + "II", header, _HEADER_LENGTHS_OFFSET)
+    # Block 2: block number (u1), block length (u2), bits per pixel, columns, lines (u2 each)
+    block_number, block_length, bits_per_pixel, columns, lines = struct.unpack_from(
+        endian + "BHHHH", header, BASIC_INFO_BLOCK_LENGTH)
+    if block_number != 2 or block_length != DATA_INFO_BLOCK_LENGTH:
+        return "missing data information block"
+    if data_length != columns * lines * bits_per_pixel // 8:
+        return f"data length {data_length} does not match a {columns}x{lines} image of {bits_per_pixel}-bit pixels"
+    if file_size != header_length + data_length:
+        return f"file size {file_size} differs from the declared {header_length} + {data_length} bytes"
+    return None
+
+
+# --- Fixed-grid geometry (nominal values of HSD header block 3) ---
+AHI_SUB_LON = 140.7
+EARTH_EQUATORIAL_RADIUS = 6378.137   # km
+EARTH_POLAR_RADIUS = 6356.7523       # km
+SATELLITE_DISTANCE = 42164.0         # km from the Earth's centre
+
+# Resolution id in the file name -> (lines of the full disk, CFAC/LFAC, COFF/LOFF)
+AHI_GRIDS: Dict[str, Tuple[int, int, float]] = {
+    "05": (22000, 81865099, 11000.5),
+    "10": (11000, 40932549, 5500.5),
+    "20": (5500, 20466275, 2750.5),
+}
+
+# Band -> resolution id of its full-disk grid
+AHI_BAND_RESOLUTION: Dict[str, str] = {
+    "01": "10", "02": "10", "03": "05", "04": "10",
+    **{f"{band:02d}": "20" for band in range(5, 17)},
+}
+
+# lon_min, lon_max, lat_min, lat_max
+BBox = Tuple[float, float, float, float]
+
+PathT = TypeVar("PathT", str, os.PathLike)
+
+NAMED_REGIONS: Dict[str, BBox] = {
+    "east_asia": (70.0, 150.0, 0.0, 60.0),
+    "china": (73.0, 136.0, 3.0, 54.0),
+    "japan": (122.0, 150.0, 20.0, 48.0),
+    "southeast_asia": (90.0, 145.0, -15.0, 25.0),
+    "australia": (110.0, 160.0, -45.0, -10.0),
+}
+
+
+def parse_bbox(text: str) -> BBox:
+    """
+    Parses a region given as "lon_min,lon_max,lat_min,lat_max" or as a name from NAMED_REGIONS.
+
+    :raises ValueError: If the text is neither a known region nor four valid coordinates.
+    """
+    name = text.strip().lower()
+    if name in NAMED_REGIONS:
+        return NAMED_REGIONS[name]
+    try:
+        lon_min, lon_max, lat_min, lat_max = (float(value) for value in text.split(","))
+    except ValueError:
+        raise ValueError(f"expected lon_min,lon_max,lat_min,lat_max or one of {', '.join(NAMED_REGIONS)}, got {text!r}")
+    if not (-90.0 <= lat_min < lat_max <= 90.0):
+        raise ValueError(f"invalid latitude range {lat_min}..{lat_max}")
+    return lon_min, lon_max, lat_min, lat_max
+
+
+def lonlat_to_line_column(lon: float, lat: float, resolution: str) -> Optional[Tuple[float, float]]:
+    """
+    Projects a geographic point onto the AHI fixed grid (CGMS normalized geostationary projection).
+
+    :param lon: Longitude in degrees.
+    :param lat: Latitude in degrees.
+    :param resolution: Resolution id of the grid ("05", "10" or "20").
+    :return: 1-based (line, column), or None if the point is not visible from the satellite.
+    """
+    _, scaling_factor, offset = AHI_GRIDS[resolution]
+    phi = math.radians(lat)
+    lam = math.radians(lon - AHI_SUB_LON)
+    ratio = (EARTH_POLAR_RADIUS / EARTH_EQUATORIAL_RADIUS) ** 2
+    c_lat = math.atan(ratio * math.tan(phi))
+    cos_c_lat = math.cos(c_lat)
+    r_l = EARTH_POLAR_RADIUS / math.sqrt(1.0 - (1.0 - ratio) * cos_c_lat ** 2)
+    # Visible if the angle between the surface point and the satellite seen from the Earth's centre is small enough
+    if SATELLITE_DISTANCE * cos_c_lat * math.cos(lam) <= r_l:
+        return None
+    r_1 = SATELLITE_DISTANCE - r_l * cos_c_lat * math.cos(lam)
+    r_2 = -r_l * cos_c_lat * math.sin(lam)
+    r_3 = r_l * math.sin(c_lat)
+    r_n = math.sqrt(r_1 ** 2 + r_2 ** 2 + r_3 ** 2)
+    x = math.degrees(math.atan(-r_2 / r_1))
+    y = math.degrees(math.asin(-r_3 / r_n))
+    column = offset + x * scaling_factor / 2 ** 16
+    line = offset + y * scaling_factor / 2 ** 16
+    return line, column
+
+
+def bbox_pixel_window(bbox: BBox, resolution: str, samples: int = 64) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Determines the part of the full-disk image covered by a lon/lat bounding box.
+
+    The box is sampled on a regular grid and each visible sample is projected to
+    the fixed grid.
+
+    :param bbox: lon_min, lon_max, lat_min, lat_max in degrees. lon_max < lon_min crosses the date line.
+    :param resolution: Resolution id of the band's grid ("05", "10" or "20").
+    :param samples: Number of samples along each side of the box.
+    :return: 1-based (first_line, last_line, first_column, last_column) clipped to the disk,
+        or None if no part of the box is visible.
+    """
+    lon_min, lon_max, lat_min, lat_max = bbox
+    if lon_max < lon_min:
+        lon_max += 360.0
+    total_lines = AHI_GRIDS[resolution][0]
+
+    lines, columns = [], []
+    for i in range(samples + 1):
+        lat = lat_min + (lat_max - lat_min) * i / samples
+        for j in range(samples + 1):
+            lon = lon_min + (lon_max - lon_min) * j / samples
+            position = lonlat_to_line_column(lon, lat, resolution)
+            if position is not None:
+                lines.append(position[0])
+                columns.append(position[1])
+
+    if not lines:
+        return None
+    return (max(min(lines), 1.0), min(max(lines), float(total_lines)),
+            max(min(columns), 1.0), min(max(columns), float(total_lines)))
+
+
+def segments_for_bbox(bbox: BBox, resolution: str, total_segments: int = FLDK_SEGMENTS,
+                      samples: int = 64) -> Set[int]:
+    """
+    Determines which full-disk segments contain part of a lon/lat bounding box.
+
+    :param bbox: lon_min, lon_max, lat_min, lat_max in degrees. lon_max < lon_min crosses the date line.
+    :param resolution: Resolution id of the band's grid ("05", "10" or "20").
+    :param total_segments: Number of segments the full disk is split into.
+    :param samples: Number of samples along each side of the box.
+    :return: The 1-based segment numbers; empty if no part of the box is visible.
+    """
+    window = bbox_pixel_window(bbox, resolution, samples)
+    if window is None:
+        return set()
+    first_line, last_line, _, _ = window
+    lines_per_segment = AHI_GRIDS[resolution][0] / total_segments
+    first_segment = int((first_line - 1) // lines_per_segment) + 1
+    last_segment = int((last_line - 1) // lines_per_segment) + 1
+    return set(range(max(first_segment, 1), min(last_segment, total_segments) + 1))
+
+
+def filter_files_for_bbox(paths: Iterable[PathT], bbox: BBox) -> List[PathT]:
+    """
+    Keeps the full-disk segment files that contain part of a lon/lat bounding box.
+
+    Files whose name is not a full-disk HSD name are kept unchanged.
+
+    :param paths: File paths (str or os.PathLike) of one or more bands.
+    :param bbox: lon_min, lon_max, lat_min, lat_max in degrees.
+    """
+    segments: Dict[Tuple[str, int], Set[int]] = {}
+    kept = []
+    for path in paths:
+        info = parse_hsd_filename(os.path.basename(path))
+        if info is None or info.area != "FLDK" or info.resolution not in AHI_GRIDS:
+            kept.append(path)
+            continue
+        key = (info.resolution, info.total_segments)
+        if key not in segments:
+            segments[key] = segments_for_bbox(bbox, info.resolution, info.total_segments)
+        if info.segment in segments[key]:
+            kept.append(path)
+    return kept
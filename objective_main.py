@@ -3,18 +3,35 @@
 import logging
 import sys
 import os
-import re
 import bz2
 import shutil
 import functools  # 为了使用部分函数应用
+import contextlib
+import tempfile
+import threading
+import multiprocessing
 import concurrent.futures
 from datetime import datetime
 from collections import defaultdict
 from pathlib import Path
+from typing import Callable
+import dask
+import dask.array as da
 import numpy as np
+import satpy
+from PIL import Image
+from pyresample import create_area_def
 from satpy import Scene
 from satpy.composites import DayNightCompositor
-from satpy.writers import to_image
+from satpy.writers import get_enhanced_image, to_image
+
+from bz2_parallel import decompress_file_parallel
+from decompressed_cache import DecompressedCache
+from file_lock import file_lock
+from hsd_reader import full_disk_shape, open_segments, resample_nearest, stitch_segments
+from hsd_utils import (AHI_GRIDS, HSD_FILENAME_PATTERN, NAMED_REGIONS, BBox, bbox_pixel_window,
+                       filter_files_for_bbox, parse_bbox, parse_hsd_filename, validate_hsd_file)
+from output_manifest import MANIFEST_FILENAME, OutputManifest, input_fingerprint
 
 # --- Configuration ---
 logging.basicConfig(
@@ -26,15 +43,83 @@ DATA_ROOT_DIR = Path("./data")
 DECOMPRESSED_DIR = Path("./decompressed_data")
 OUTPUT_DIR = Path("./output_images")
 SATELLITE_READER = "ahi_hsd"
+# Satpy 缓存固定网格经纬度和传感器角度的目录（需要 zarr）
+NAVIGATION_CACHE_DIR = Path("./navigation_cache")
+# 读取方式: "satpy" 使用 Satpy 生成真彩色昼夜合成图; "native" 用 hsd_reader 直接读取，生成真彩色快视图
+READER_ENGINE = "satpy"
+# 每个时间点生成的产品，共用一次 Scene 加载：共同依赖的波段只读取、定标和重采样一次，所有图像在一次计算中写出。
+# "true_color" 为真彩色昼夜合成（夜间用反转的 B13），"B13" 等波段名为单波段图像，
+# 其余为 Satpy 的 AHI 合成名，例如 airmass、ash、natural_color、water_vapors1
+PRODUCTS = ["true_color"]
+# 输出格式: "png"; "cog" 为分块、DEFLATE 压缩、带内部概视图的 Cloud-Optimized GeoTIFF（需要 rasterio），
+# 保留投影和地理参考，查看器只需读取所需的瓦片和概视图层级
+OUTPUT_FORMAT = "png"
+# 自定义区域 COG 的坐标系: None 保留静止卫星投影; "EPSG:4326" 重投影到等经纬度网格
+COG_REGION_CRS = None
+# 重投影到经纬度网格时 1 度对应的距离（米），用于按原始像元大小确定网格分辨率
+METERS_PER_DEGREE = 111320.0
 MAX_DECOMPRESSION_THREADS = os.cpu_count() or 4
-FILENAME_PATTERN = re.compile(r"HS_H09_(\d{8})_(\d{4})_B\d{2}_.*\.DAT\.bz2")
+# 解压引擎: "stdlib" 逐文件单核解压; "parallel" 按 bzip2 块在多个进程中并行解压单个文件
+DECOMPRESSION_ENGINE = "stdlib"
+# 文件级并发方式: "thread" 线程池; "process" 进程池; "auto" 按文件大小选择
+DECOMPRESSION_BACKEND = "thread"
+# auto 模式下不小于该大小的文件交给进程池，其余用线程池
+AUTO_PROCESS_MIN_SIZE = 8 * 1024 * 1024
+# 解压目录的容量上限（字节），超过后按最近访问时间淘汰；0 表示不限制
+DECOMPRESSED_CACHE_MAX_BYTES = 50 * 1024 ** 3
+# 为 True 时 .bz2 解压到内存文件系统，生成图像后即删除，不写入 DECOMPRESSED_DIR
+IN_MEMORY_DECOMPRESSION = False
+IN_MEMORY_DIR = Path("/dev/shm")
+# run() 在生成当前时间点图像的同时预先解压后续几个时间点；0 表示不预解压
+PREFETCH_SLOTS = 1
+# 解压目录所在磁盘的剩余空间低于该值时暂停预解压
+PREFETCH_MIN_FREE_BYTES = 20 * 1024 ** 3
+# 同时渲染的时间点数（每个时间点一个工作进程）；1 表示逐个处理
+RENDER_PROCESSES = 1
+# 渲染一个全圆盘时间点的峰值内存估计，用于按内存上限限制工作进程数
+RENDER_MEMORY_PER_SLOT_BYTES = 8 * 1024 ** 3
+# 所有工作进程的内存上限；None 表示物理内存的 80%
+RENDER_MEMORY_LIMIT_BYTES = None
+# 输出清单：记录每个时间点、每个产品的输入文件和处理参数，二者未变化且图像已存在时跳过
+OUTPUT_MANIFEST_FILE = OUTPUT_DIR / MANIFEST_FILENAME
+SKIP_UNCHANGED_OUTPUTS = True
+FILENAME_PATTERN = HSD_FILENAME_PATTERN  # 与 download.py 共用的 HSD 文件名解析
 
 class HimawariProcessor:
     '处理 Himawari 卫星数据的类'
-    def __init__(self):
+    def __init__(self,
+                 manage_cache: bool = True,
+                 products: list[str] | None = None,
+                 skip_unchanged: bool = SKIP_UNCHANGED_OUTPUTS):
+        """
+        manage_cache 为 False 时不记录访问、不淘汰解压缓存（由父进程统一管理）。
+        products 为每个时间点生成的产品，默认 PRODUCTS。
+        skip_unchanged 为 False 时忽略输出清单重新生成所有图像（仍会更新清单）。
+        """
+        self.products = list(products or PRODUCTS)
+        self.skip_unchanged = skip_unchanged
+        self.output_manifest = OutputManifest(OUTPUT_MANIFEST_FILE)
         # 确保输出目录存在
         DECOMPRESSED_DIR.mkdir(parents=True, exist_ok=True)
         OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        self.decompressed_cache = (DecompressedCache(DECOMPRESSED_DIR, DECOMPRESSED_CACHE_MAX_BYTES)
+                                   if manage_cache else None)
+        self.enable_navigation_cache()
+
+    @staticmethod
+    def enable_navigation_cache():
+        """
+        让 Satpy 把经纬度和卫星天顶角等传感器角度缓存到磁盘。固定网格每个时间点的结果都相同，
+        之后的 Scene 直接读取缓存；投影参数变化时 Satpy 的缓存键随之变化。缓存需要 zarr。
+        """
+        try:
+            import zarr  # noqa: F401
+        except ImportError:
+            logging.info("未安装 zarr，Satpy 不缓存经纬度和传感器角度。")
+            return
+        satpy.config.set(cache_dir=str(NAVIGATION_CACHE_DIR / "satpy"),
+                         cache_lonlats=True,
+                         cache_sensor_angles=True)
 
     def scan_available_data(self, data_root: Path) -> dict[str, list[Path]]:
         """
@@ -46,8 +131,7 @@ class HimawariProcessor:
         for bz2_file in data_root.rglob("HS_H09_*.DAT.bz2"):
             match = FILENAME_PATTERN.match(bz2_file.name)
             if match:
-                date_str, time_str = match.groups()
-                slot_key = f"{date_str}_{time_str}"
+                slot_key = f"{match['date']}_{match['time']}"
                 available_slots[slot_key].append(bz2_file)
                 file_count += 1
             else:
@@ -119,82 +203,198 @@ class HimawariProcessor:
         print("\n请选择处理的区域(默认为 finest_area ):")
         print("  1: finest_area")
         print("  2: coarsest_area")
-        print("  3: 自定义区域 (输入坐标范围)暂不支持自定义区域选择。")
+        print("  3: 自定义区域 (区域名或经纬度范围，只读取和处理该区域)")
 
         while True:
             user_input = input("> ").strip()
-            # if user_input == "1":
-            #     return "finest_area"
-            # elif user_input == "2":
-            #     return "coarsest_area"
-            # elif user_input == "3":
-            #     coords = input("请输入坐标范围 (例如: lon_min, lon_max, lat_min, lat_max): ")
-            #     return coords
-            # else:
-            #     print("输入无效。请输入 1, 2 或 3。")
             match user_input:
                 case "1":
                     return "finest_area"
                 case "2":
                     return "coarsest_area"
                 case "3":
-                    print("暂不支持自定义区域选择。")
-                    continue
-                    # coords = input("请输入坐标范围 (例如: lon_min, lon_max, lat_min, lat_max): ")
-                    # return coords
+                    region = input(f"请输入区域名 ({', '.join(NAMED_REGIONS)}) "
+                                   "或坐标范围 (例如: 100,140,20,50 即 lon_min,lon_max,lat_min,lat_max): ").strip()
+                    try:
+                        parse_bbox(region)
+                    except ValueError as e:
+                        print(f"区域无效: {e}")
+                        continue
+                    logging.info("用户选择了自定义区域: %s", region)
+                    return region
                 case _:
                     logging.info("用户无输入，选择默认区域: finest_area")
                     return "finest_area"
 
-    def decompress_bz2(self, bz2_file_path: Path, output_dir: Path) -> Path | None:
+    @staticmethod
+    def parse_region(resample_area: str) -> tuple[str, BBox] | None:
+        """
+        解析自定义区域：区域名 (NAMED_REGIONS) 或 "lon_min,lon_max,lat_min,lat_max"。
+        返回 (用于输出文件名的标签, 经纬度范围)；finest_area / coarsest_area 返回 None，无效时抛出 ValueError。
+        """
+        if resample_area in ("finest_area", "coarsest_area"):
+            return None
+        bbox = parse_bbox(resample_area)
+        name = resample_area.strip().lower()
+        label = name if name in NAMED_REGIONS else "_".join(f"{value:g}" for value in bbox)
+        return label, bbox
+
+    @classmethod
+    def area_label(cls, resample_area: str) -> str:
+        """
+        输出清单中区域的标签：自定义区域为文件名中的标签，否则为 finest_area / coarsest_area。
+        """
+        region = cls.parse_region(resample_area)
+        return region[0] if region else resample_area
+
+    def region_files(self, slot_files: list[Path], resample_area: str) -> list[Path]:
+        """
+        自定义区域只保留与区域相交的全圆盘分段，其余分段不解压也不读取。
+        """
+        region = self.parse_region(resample_area)
+        if region is None:
+            return slot_files
+        return filter_files_for_bbox(slot_files, region[1])
+
+    @staticmethod
+    def region_lonlat_area(label: str, bbox: BBox, pixel_size: float):
+        """
+        覆盖区域的等经纬度网格 (EPSG:4326)，分辨率与原始像元大小 (米) 相当。跨越日界线时经度取 0~360。
+        """
+        lon_min, lon_max, lat_min, lat_max = bbox
+        crs = "EPSG:4326"
+        if lon_max < lon_min:
+            lon_max += 360.0
+            crs = "+proj=longlat +datum=WGS84 +lon_wrap=180 +no_defs"
+        return create_area_def(label, crs,
+                               area_extent=(lon_min, lat_min, lon_max, lat_max),
+                               resolution=pixel_size / METERS_PER_DEGREE,
+                               units="degrees")
+
+    @staticmethod
+    def compute_images(results: list):
         """
-        解压 .bz2 文件，检查重复和零大小。
+        在一次 dask.compute 中写出所有图像，共享的任务只执行一次。
+        PNG 的 save(compute=False) 返回 dask 数组；GeoTIFF 返回 ([数据], [目标文件])，写完后需关闭目标文件。
+        """
+        tasks = []
+        targets = []
+        for result in results:
+            if isinstance(result, tuple):
+                sources, result_targets = (item if isinstance(item, list) else [item] for item in result)
+                tasks.append(da.store(sources, result_targets, compute=False))
+                targets.extend(result_targets)
+            else:
+                tasks.append(result)
+        try:
+            dask.compute(*tasks)
+        finally:
+            for target in targets:
+                target.close()
+
+    @staticmethod
+    def decompress_bz2(bz2_file_path: Path,
+                       output_dir: Path,
+                       engine: str = "stdlib",
+                       block_executor: concurrent.futures.Executor | None = None
+                       ) -> Path | None:
+        """
+        解压 .bz2 文件。已存在的输出按 HSD 头中声明的长度校验，不完整则重新解压。
+        先写入临时文件再原子重命名，并用每个输出各自的锁文件协调多个进程：
+        只有一个进程解压，其余等待后直接使用结果。
+        engine 为 "parallel" 时按块并行解压，block_executor 为共享的进程池。
+        不依赖实例状态，以便在进程池中调用。
         """
         output_filename = bz2_file_path.stem
         output_path = output_dir / output_filename
+        # 临时文件名不以 .DAT 结尾，不会被当作已解压文件
+        temp_path = output_dir / f"{output_filename}.{os.getpid()}.{threading.get_ident()}.tmp"
         try:
-            if output_path.exists():
-                if output_path.stat().st_size > 0:
-                    return output_path
-                else:
-                    logging.warning("存在但大小为零，重新解压: %s", output_path)
-                    output_path.unlink()
+            if output_path.exists() and validate_hsd_file(output_path) is None:
+                return output_path
+
+            with file_lock(output_dir / f"{output_filename}.lock"):
+                # 等待锁期间其它进程可能已经解压完成
+                if output_path.exists():
+                    problem = validate_hsd_file(output_path)
+                    if problem is None:
+                        return output_path
+                    else:
+                        logging.warning("已解压的文件不完整，重新解压 %s: %s", output_path, problem)
+                        output_path.unlink()
 
-            with bz2.open(bz2_file_path, "rb") as f_in:
-                with open(output_path, "wb") as f_out:
-                    shutil.copyfileobj(f_in, f_out)
+                if engine == "parallel":
+                    decompress_file_parallel(bz2_file_path, temp_path, block_executor)
+                else:
+                    with bz2.open(bz2_file_path, "rb") as f_in:
+                        with open(temp_path, "wb") as f_out:
+                            shutil.copyfileobj(f_in, f_out)
+                os.replace(temp_path, output_path)
             return output_path
         except OSError as e:
             logging.error("解压文件时出错 %s: %s", bz2_file_path.name, e)
-            if output_path.exists():
-                output_path.unlink()
             return None
         except Exception as e:
             logging.error("处理文件时发生意外错误 %s: %s", bz2_file_path.name, e)
-            if output_path.exists():
-                output_path.unlink()
             return None
+        finally:
+            temp_path.unlink(missing_ok=True)
 
     def decompress_files_multithreaded(self,
                                        bz2_files: list[Path],
                                        output_dir: Path,
-                                       max_workers: int
+                                       max_workers: int,
+                                       engine: str = DECOMPRESSION_ENGINE,
+                                       backend: str = DECOMPRESSION_BACKEND
                                        ) -> dict[Path, Path | None]:
         """
-        多线程解压缩 .bz2 文件列表。
+        并发解压缩 .bz2 文件列表。
+        backend 选择线程池、进程池，或 "auto" 按文件大小分配（大文件用进程池）。
+        engine 为 "parallel" 时所有文件共享一个进程池，按块并行解压（仅线程池中的文件）；
+        进程池中的文件总是用 stdlib 解压。
         """
         if not bz2_files:
             return {}
 
-        logging.info("开始使用最多 %s 个线程解压 %s个文件...", max_workers, len(bz2_files))
+        match backend:
+            case "thread":
+                thread_files, process_files = bz2_files, []
+            case "process":
+                thread_files, process_files = [], bz2_files
+            case "auto":
+                thread_files, process_files = [], []
+                for bz2_file in bz2_files:
+                    is_large = bz2_file.stat().st_size >= AUTO_PROCESS_MIN_SIZE
+                    (process_files if is_large else thread_files).append(bz2_file)
+            case _:
+                raise ValueError(f"未知的解压方式: {backend}")
+
+        logging.info("开始解压 %s 个文件 (最多 %s 个并发, 方式: %s, 引擎: %s, 线程 %s 个/进程 %s 个)...",
+                     len(bz2_files), max_workers, backend, engine, len(thread_files), len(process_files))
         results = {}
-        decompress_func = functools.partial(self.decompress_bz2, output_dir=output_dir)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_path = {
-                executor.submit(decompress_func, bz2_file): bz2_file
-                for bz2_file in bz2_files
-            }
+        with contextlib.ExitStack() as stack:
+            future_to_path = {}
+            if thread_files:
+                block_executor = None
+                if engine == "parallel":
+                    block_executor = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+                    stack.callback(block_executor.shutdown)
+                thread_executor = stack.enter_context(
+                    concurrent.futures.ThreadPoolExecutor(max_workers=max_workers))
+                decompress_func = functools.partial(self.decompress_bz2, output_dir=output_dir,
+                                                    engine=engine, block_executor=block_executor)
+                for bz2_file in thread_files:
+                    future_to_path[thread_executor.submit(decompress_func, bz2_file)] = bz2_file
+            if process_files:
+                # 每个进程解压一个完整文件，绕开 GIL。总是用 stdlib 引擎：进程池的工作进程
+                # 是守护进程，不能再创建块级并行所需的进程池
+                process_executor = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(max_workers=min(max_workers, os.cpu_count() or 1)))
+                decompress_func = functools.partial(HimawariProcessor.decompress_bz2, output_dir=output_dir)
+                for bz2_file in process_files:
+                    future_to_path[process_executor.submit(decompress_func, bz2_file)] = bz2_file
+
             decompressed_count = 0
             for future in concurrent.futures.as_completed(future_to_path):
                 original_path = future_to_path[future]
@@ -222,35 +422,137 @@ class HimawariProcessor:
                 )
         return results
 
-    def invert_image(self, np_array):
+    @contextlib.contextmanager
+    def decompress_in_memory(self, bz2_files: list[Path]):
+        """
+        把 .bz2 文件解压到内存文件系统 (IN_MEMORY_DIR) 下的临时目录，文件名不变，
+        以便 ahi_hsd 读取器识别。with 块结束时删除整个目录，释放内存。
+        """
+        memory_dir = IN_MEMORY_DIR if IN_MEMORY_DIR.is_dir() else None
+        if memory_dir is None:
+            logging.warning("%s 不可用，改用系统临时目录解压。", IN_MEMORY_DIR)
+        with tempfile.TemporaryDirectory(prefix="himawari_", dir=memory_dir) as temp_dir:
+            yield self.decompress_files_multithreaded(
+                bz2_files, Path(temp_dir), MAX_DECOMPRESSION_THREADS
+            )
+
+    def invert_image(self, data_array):
         """
         Inverts the image by subtracting each pixel value from the maximum value of the image.
+        min 和 max 在同一次 dask.compute 中计算（共享任务图，数据只遍历一遍）；
+        反转本身 (max + min - x) 保持惰性、按块计算，保留坐标和 attrs，不把整个数组读入内存。
         """
-        min_val = np.nanmin(np_array)
-        max_val = np.nanmax(np_array)
-        return max_val - (np_array - min_val)
+        min_val, max_val = dask.compute(data_array.min(), data_array.max())
+        return data_array.copy(data=(float(max_val) + float(min_val)) - data_array.data)
+
+    def process_native_true_color(self,
+                                  decompressed_files: list[Path],
+                                  output_dir: Path,
+                                  resample_area: str = "finest_area"
+                                  ) -> dict[str, Path]:
+        """
+        不经过 Satpy 的快速路径：用 hsd_reader 内存映射读取 B01/B02/B03，直接生成真彩色快视图。
+        没有瑞利校正、太阳天顶角校正和昼夜合成，适合快速浏览。
+        返回成功写出的 {"true_color": 图像路径}。
+        """
+        try:
+            bands = open_segments(decompressed_files)
+            rgb_bands = ("B03", "B02", "B01")
+            if not set(rgb_bands).issubset(bands):
+                logging.warning("缺少必要的波段，无法生成真彩色快视图。")
+                return {}
+
+            shapes = [full_disk_shape(bands[band]) for band in rgb_bands]
+            region = self.parse_region(resample_area)
+            match resample_area:
+                case "finest_area":
+                    shape = max(shapes)
+                case "coarsest_area":
+                    shape = min(shapes)
+                case _ if region is not None:
+                    shape = max(shapes)
+                case _:
+                    logging.warning("未知的重采样区域: %s", resample_area)
+                    return {}
+
+            # 自定义区域：在最粗网格上取整确定行列范围，各波段按整数倍放大，保证窗口互相对齐
+            windows = {band: None for band in rgb_bands}
+            if region is not None:
+                coarsest = min(shapes)[0]
+                pixel_window = bbox_pixel_window(region[1], "20")
+                if pixel_window is None:
+                    logging.warning("区域 %s 不在全圆盘可见范围内。", region[0])
+                    return {}
+                scale = coarsest / AHI_GRIDS["20"][0]
+                first_line, last_line, first_column, last_column = pixel_window
+                lines = (int(np.floor((first_line - 1) * scale)), int(np.ceil(last_line * scale)))
+                columns = (int(np.floor((first_column - 1) * scale)), int(np.ceil(last_column * scale)))
+                for band, band_shape in zip(rgb_bands, shapes):
+                    factor = band_shape[0] // coarsest
+                    windows[band] = (slice(lines[0] * factor, lines[1] * factor),
+                                     slice(columns[0] * factor, columns[1] * factor))
+                factor = shape[0] // coarsest
+                shape = ((lines[1] - lines[0]) * factor, (columns[1] - columns[0]) * factor)
+
+            scan_time = bands["B03"][0].start_time
+            date_str = scan_time.strftime("%Y%m%d")
+            time_str = scan_time.strftime("%H%M")
+            current_output_dir = output_dir / date_str
+            current_output_dir.mkdir(parents=True, exist_ok=True)
+            logging.info("--- 开始生成快视图 %s ---", scan_time.strftime("%Y-%m-%d %H:%M"))
+
+            channels = []
+            for band in rgb_bands:
+                # 反射率 (%) -> 0~1 -> gamma 2.2 -> 8 位；先转成 8 位再重采样，节省内存
+                reflectance = stitch_segments(bands[band], window=windows[band])
+                np.clip(reflectance / 100.0, 0.0, 1.0, out=reflectance)
+                channel = np.nan_to_num(reflectance ** (1 / 2.2) * 255).astype(np.uint8)
+                del reflectance
+                channels.append(resample_nearest(channel, shape))
+
+            suffix = f"_{region[0]}" if region else ""
+            output_filename = current_output_dir / f"{date_str}_{time_str}_TrueColor{suffix}_native.png"
+            Image.fromarray(np.dstack(channels), "RGB").save(output_filename)
+            logging.info("生成的快视图已保存到: %s", output_filename)
+            return {"true_color": output_filename}
+        except Exception as e:
+            logging.error("生成快视图时发生错误: %s", e)
+            return {}
 
     def process_true_data(self,
                           decompressed_files: list[Path],
                           output_dir: Path,
-                          resample_area: str = "finest_area"
-                          ):
+                          resample_area: str = "finest_area",
+                          products: list[str] | None = None
+                          ) -> dict[str, Path]:
         """
-        使用 Satpy 处理解压缩后的数据文件，生成合成图像。
+        使用 Satpy 处理解压缩后的数据文件，从同一个 Scene 生成各产品图像。
+        products 默认为 self.products；返回成功写出的 {产品: 图像路径}。
         """
         if not decompressed_files:
             logging.warning("没有可供处理的解压缩文件。")
-            return
+            return {}
+
+        if READER_ENGINE == "native":
+            if set(self.products) - {"true_color"}:
+                logging.warning("native 读取方式只生成真彩色快视图，忽略其他产品。")
+            if OUTPUT_FORMAT != "png":
+                logging.warning("native 读取方式只输出 PNG 快视图。")
+            return self.process_native_true_color(decompressed_files, output_dir, resample_area)
+
+        try:
+            region = self.parse_region(resample_area)
+        except ValueError as e:
+            logging.warning("未知的重采样区域: %s (%s)", resample_area, e)
+            return {}
 
         try:
             scn = Scene(decompressed_files, reader=SATELLITE_READER)
             scan_time = scn.start_time
             if not scan_time:
                 try:
-                    fname = decompressed_files[0].name
-                    parts = fname.split("_")
-                    date_str, time_str = parts[2], parts[3]
-                    scan_time = datetime.strptime(f"{date_str}{time_str}", "%Y%m%d%H%M")
+                    info = parse_hsd_filename(decompressed_files[0].name)
+                    scan_time = datetime.strptime(info.timestamp, "%Y%m%d%H%M")
                     logging.warning("无法从元数据获取时间，从文件名解析: %s", scan_time)
                 except Exception as e:
                     logging.error(
@@ -258,7 +560,7 @@ class HimawariProcessor:
                         decompressed_files,
                         e
                     )
-                    return
+                    return {}
 
             date_str = scan_time.strftime("%Y%m%d")
             time_str = scan_time.strftime("%H%M")
@@ -270,44 +572,189 @@ class HimawariProcessor:
                 scan_time.strftime("%Y-%m-%d %H:%M")
             )
 
-            true_color_base_bands = {"B01", "B02", "B03"}
-            available_datasets = set(scn.available_dataset_names())
-            resampled_scn = None
-            if true_color_base_bands.issubset(available_datasets):
-                scn.load(['true_color', 'B13'])
+            # 真彩色昼夜合成还需要 B13 作为夜间部分；其余产品直接加载同名数据集或合成
+            available_products = set(scn.available_dataset_names()) | set(scn.available_composite_names())
+            loadable_products = []
+            for product in products or self.products:
+                if product in available_products and (product != "true_color" or "B13" in available_products):
+                    loadable_products.append(product)
+                else:
+                    logging.warning("缺少必要的波段，无法生成 %s。", product)
+            if not loadable_products:
+                return {}
+            load_names = list(dict.fromkeys(
+                name for product in loadable_products
+                for name in (["true_color", "B13"] if product == "true_color" else [product])))
+
+            # 所有产品一起加载：Satpy 按依赖树合并共同依赖的波段，每个波段只读取和定标一次
+            if region is not None:
+                # 先只加载波段、不生成合成，裁剪到区域后再由 resample 生成合成，
+                # 只读取和定标区域内的行列，合成和重采样也只在区域内计算
+                scn.load(load_names, generate=False)
+                lon_min, lon_max, lat_min, lat_max = region[1]
+                if lon_max < lon_min:  # 跨越日界线
+                    lon_max += 360.0
+                cropped_scn = scn.crop(ll_bbox=(lon_min, lat_min, lon_max, lat_max))
+                del scn
+                resampled_scn = cropped_scn.resample(cropped_scn.finest_area(), resampler="native")
+                del cropped_scn
+                if OUTPUT_FORMAT == "cog" and COG_REGION_CRS == "EPSG:4326":
+                    # 合成已在静止卫星网格上生成，这里只对区域内的结果做最近邻重投影
+                    finest_area = resampled_scn.finest_area()
+                    lonlat_area = self.region_lonlat_area(region[0], region[1], finest_area.pixel_size_x)
+                    resampled_scn = resampled_scn.resample(lonlat_area, resampler="nearest")
+            else:
+                if OUTPUT_FORMAT == "cog" and COG_REGION_CRS:
+                    logging.info("全圆盘不重投影，COG 保留静止卫星投影。")
+                scn.load(load_names)
                 area = None
                 match resample_area:
                     case "finest_area":
                         area = scn.finest_area()
                     case "coarsest_area":
                         area = scn.coarsest_area()
-                    case _:
-                        print("暂不支持")
-                        logging.warning("未知的重采样区域: %s", resample_area)
-                        return
 
                 resampled_scn = scn.resample(area, resampler="native")
                 del scn
-            else:
-                logging.warning("缺少必要的波段，无法生成真彩色图像。")
 
-            logging.info("  重采样成功，'%s' 已生成。", 'true_color')
+            logging.info("  重采样成功，'%s' 已生成。", "', '".join(loadable_products))
 
-            invert_data = self.invert_image(resampled_scn['B13'].values)
-            resampled_scn['B13'].values = invert_data
+            # 各产品的图像只构建任务图，最后一起计算：共享的波段和中间结果只计算一次
+            suffix = f"_{region[0]}" if region else ""
+            extension = ".tif" if OUTPUT_FORMAT == "cog" else ".png"
+            results = []
+            outputs = {}
+            for product in loadable_products:
+                if product not in resampled_scn:
+                    logging.warning("无法生成 %s。", product)
+                    continue
+                if product == "true_color":
+                    night = self.invert_image(resampled_scn["B13"])
+                    compositor = DayNightCompositor('DN', day_night="day_night")
+                    img = to_image(compositor([resampled_scn['true_color'], night]))
+                    label = "TrueColor"
+                else:
+                    img = get_enhanced_image(resampled_scn[product])
+                    label = product
+                output_filename = (
+                            current_output_dir / f"{date_str}_{time_str}_{label}{suffix}{extension}"
+                        )
+                if OUTPUT_FORMAT == "cog":
+                    # COG 驱动自动生成分块和内部概视图 (overviews=[])；无数据区域由 alpha 波段标记
+                    results.append(img.save(str(output_filename), driver="COG",
+                                            compress="DEFLATE", overviews=[],
+                                            overview_resampling="AVERAGE", compute=False))
+                else:
+                    results.append(img.save(str(output_filename), fill_value=0.0, compute=False))
+                outputs[product] = output_filename
 
-            compositor = DayNightCompositor('DN', day_night="day_night")
-            composite = compositor([resampled_scn['true_color'], resampled_scn["B13"]])
-            img = to_image(composite)
-            output_filename = (
-                        current_output_dir / f"{date_str}_{time_str}_TrueColor.png"
-                    )
-            img.save(str(output_filename), fill_value=0.0)
-            logging.info("生成的图像已保存到: %s", output_filename)
+            self.compute_images(results)
+            for output_filename in outputs.values():
+                logging.info("生成的图像已保存到: %s", output_filename)
+            return outputs
         except Exception as e:
             logging.error("处理数据时发生错误: %s", e)
+            return {}
+
+    @staticmethod
+    def slot_output_paths(slot_files: list[Path]) -> list[Path]:
+        """
+        一个时间点解压后供读取的文件路径（.bz2 对应解压目录中的 .DAT）。
+        """
+        return [DECOMPRESSED_DIR / f.stem if f.suffix == ".bz2" else f for f in slot_files]
+
+    @staticmethod
+    def slot_key(slot_files: list[Path]) -> str | None:
+        """
+        时间点的键 "YYYYMMDD_HHMM"（与 scan_available_data 相同），无法从文件名解析时返回 None。
+        """
+        for f in slot_files:
+            info = parse_hsd_filename(f.name)
+            if info:
+                return f"{info.timestamp[:8]}_{info.timestamp[8:]}"
+        return None
+
+    @staticmethod
+    def slot_fingerprint(slot_files: list[Path], resample_area: str) -> str | None:
+        """
+        时间点的输入文件（文件名、大小、修改时间）和处理参数的指纹，用于判断输出是否需要更新。
+        """
+        return input_fingerprint(slot_files, {"area": resample_area, "reader": READER_ENGINE,
+                                              "format": OUTPUT_FORMAT, "region_crs": COG_REGION_CRS})
+
+    def pending_products(self, slot_files: list[Path], resample_area: str) -> list[str]:
+        """
+        时间点还需要生成的产品：从未生成、输出文件已不存在，或输入文件、处理参数有变化。
+        slot_files 为按区域筛选后的输入文件。
+        """
+        products = ["true_color"] if READER_ENGINE == "native" else self.products
+        slot_key = self.slot_key(slot_files)
+        if not self.skip_unchanged or slot_key is None:
+            return list(products)
+        fingerprint = self.slot_fingerprint(slot_files, resample_area)
+        return [product for product in products
+                if not self.output_manifest.is_current(slot_key, self.area_label(resample_area),
+                                                       product, fingerprint)]
+
+    def process_slot(self,
+                     slot_files: list[Path],
+                     resample_area: str = "finest_area",
+                     in_memory: bool = IN_MEMORY_DECOMPRESSION,
+                     on_decompressed: Callable[[], None] | None = None
+                     ):
+        """
+        处理一个时间点：解压 .bz2 文件（已解压的 .DAT 文件直接使用），然后生成图像。
+        in_memory 为 True 时解压到内存，图像生成后立即释放，不经过解压缓存。
+        on_decompressed 在解压完成、开始渲染前调用，process_slots 借此在渲染期间预解压后续时间点。
+        自定义区域只解压和读取与区域相交的分段。
+        输出清单中输入和参数都未变化的产品不再生成；全部未变化时不解压，直接返回。
+        """
+        slot_files = self.region_files(slot_files, resample_area)
+        slot_key = self.slot_key(slot_files)
+        products = self.pending_products(slot_files, resample_area)
+        if not products:
+            logging.info("时间点 %s 的输出已是最新，跳过。", slot_key)
+            return
+        # 处理前计算指纹：处理期间输入若有变化，下次运行会重新生成
+        fingerprint = self.slot_fingerprint(slot_files, resample_area)
+
+        bz2_files = [f for f in slot_files if f.suffix == ".bz2"]
+        ready_files = [f for f in slot_files if f.suffix != ".bz2"]
+
+        if in_memory:
+            with self.decompress_in_memory(bz2_files) as decompressed_files:
+                outputs = self.process_true_data(
+                    decompressed_files=ready_files + [f for f in decompressed_files.values() if f],
+                    output_dir=OUTPUT_DIR,
+                    resample_area=resample_area,
+                    products=products
+                )
+            if slot_key:
+                self.output_manifest.record(slot_key, self.area_label(resample_area), outputs, fingerprint)
             return
 
+        # 处理期间固定本时间点的文件，淘汰旧文件时不会删除它们
+        cache = self.decompressed_cache
+        with cache.pinned(self.slot_output_paths(slot_files)) if cache else contextlib.nullcontext():
+            decompressed_files = self.decompress_files_multithreaded(
+                bz2_files, DECOMPRESSED_DIR, MAX_DECOMPRESSION_THREADS
+            )
+
+            successful_files = ready_files + [f for f in decompressed_files.values() if f]
+            if cache:
+                cache.touch(successful_files)
+                cache.evict()
+            if on_decompressed:
+                on_decompressed()
+
+            outputs = self.process_true_data(decompressed_files=successful_files,
+                                             output_dir=OUTPUT_DIR,
+                                             resample_area=resample_area,
+                                             products=products
+                                             )
+        if slot_key:
+            self.output_manifest.record(slot_key, self.area_label(resample_area), outputs, fingerprint)
+
     def run(self):
         ''' 主运行函数，执行整个处理流程。'''
         available_slots = self.scan_available_data(DATA_ROOT_DIR)
@@ -322,20 +769,179 @@ class HimawariProcessor:
 
         area = self.prompt_user_area_choosen()
 
-        for slot_key in selected_slots:
-            bz2_files = available_slots[slot_key]
-            logging.info("处理时间点: %s", slot_key)
+        self.process_slots([(slot_key, available_slots[slot_key]) for slot_key in selected_slots], area)
 
-            decompressed_files = self.decompress_files_multithreaded(
-                bz2_files, DECOMPRESSED_DIR, MAX_DECOMPRESSION_THREADS
-            )
+    def prefetch_has_space(self) -> bool:
+        """
+        解压目录所在磁盘是否还有足够空间用于预解压。
+        """
+        free_bytes = shutil.disk_usage(DECOMPRESSED_DIR).free
+        if free_bytes < PREFETCH_MIN_FREE_BYTES:
+            logging.info("磁盘剩余空间 %.1f GB 低于 %.1f GB，暂停预解压。",
+                         free_bytes / 1024 ** 3, PREFETCH_MIN_FREE_BYTES / 1024 ** 3)
+            return False
+        return True
+
+    def process_slots(self,
+                      slots: list[tuple[str, list[Path]]],
+                      resample_area: str = "finest_area",
+                      lookahead: int = PREFETCH_SLOTS,
+                      processes: int = RENDER_PROCESSES
+                      ):
+        """
+        依次处理多个时间点。生成当前时间点图像的同时，后台线程预先解压后续 lookahead 个时间点，
+        轮到它们时解压结果直接命中。预解压的文件在处理完之前保持固定，不会被淘汰。
+        内存解压模式下不预解压。processes 大于 1 时改为多进程并行渲染。
+        """
+        # 自定义区域只预解压和固定与区域相交的分段
+        slots = [(slot_key, self.region_files(slot_files, resample_area)) for slot_key, slot_files in slots]
+        # 输出已是最新的时间点不再预解压和渲染，部分失败后重新运行只处理缺失的时间点
+        pending_slots = [(slot_key, slot_files) for slot_key, slot_files in slots
+                         if self.pending_products(slot_files, resample_area)]
+        if len(pending_slots) < len(slots):
+            logging.info("%s 个时间点的输出已是最新，跳过。", len(slots) - len(pending_slots))
+        slots = pending_slots
+        if processes > 1 and len(slots) > 1:
+            self.process_slots_parallel(slots, resample_area, processes)
+            return
 
-            successful_files = [f for f in decompressed_files.values() if f]
+        try:
+            if lookahead <= 0 or IN_MEMORY_DECOMPRESSION:
+                for slot_key, slot_files in slots:
+                    logging.info("处理时间点: %s", slot_key)
+                    self.process_slot(slot_files, resample_area)
+                return
+
+            prefetched: dict[int, concurrent.futures.Future] = {}
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch") as prefetcher, \
+                    contextlib.ExitStack() as pins:
+                slot_pins: dict[int, contextlib.ExitStack] = {}
+                next_prefetch = 1
+                index = 0
+
+                def submit_prefetches():
+                    # 当前时间点解压完成后才提交，预解压不与它争用解压线程
+                    nonlocal next_prefetch
+                    # 因磁盘空间不足而跳过的时间点不再预解压
+                    next_prefetch = max(next_prefetch, index + 1)
+                    while next_prefetch < min(index + 1 + lookahead, len(slots)) and self.prefetch_has_space():
+                        prefetch_files = slots[next_prefetch][1]
+                        slot_pins[next_prefetch] = pins.enter_context(contextlib.ExitStack())
+                        slot_pins[next_prefetch].enter_context(
+                            self.decompressed_cache.pinned(self.slot_output_paths(prefetch_files)))
+                        prefetched[next_prefetch] = prefetcher.submit(
+                            self.decompress_files_multithreaded,
+                            [f for f in prefetch_files if f.suffix == ".bz2"],
+                            DECOMPRESSED_DIR,
+                            MAX_DECOMPRESSION_THREADS,
+                        )
+                        logging.info("开始预解压时间点: %s", slots[next_prefetch][0])
+                        next_prefetch += 1
+
+                for index, (slot_key, slot_files) in enumerate(slots):
+                    future = prefetched.pop(index, None)
+                    if future is not None:
+                        try:
+                            future.result()
+                        except Exception as e:
+                            # 预解压失败不影响处理，process_slot 会重新解压
+                            logging.warning("预解压时间点 %s 失败: %s", slot_key, e)
+
+                    logging.info("处理时间点: %s", slot_key)
+                    self.process_slot(slot_files, resample_area, on_decompressed=submit_prefetches)
+                    # 输出已是最新而未解压的时间点不会调用 on_decompressed，在此补交
+                    submit_prefetches()
+                    if index in slot_pins:
+                        slot_pins.pop(index).close()
+        finally:
+            # process_slot 只在本时间点的文件仍被固定时淘汰；全部释放后再淘汰一次，
+            # 运行结束时解压目录不超过上限
+            if self.decompressed_cache:
+                self.decompressed_cache.evict()
+
+    @staticmethod
+    def render_worker_count(processes: int, slot_count: int) -> int:
+        """
+        按 CPU 核数、内存上限和时间点数量限制并行渲染的工作进程数。
+        """
+        memory_limit = RENDER_MEMORY_LIMIT_BYTES
+        if memory_limit is None:
+            try:
+                memory_limit = int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") * 0.8)
+            except (AttributeError, ValueError, OSError):  # Windows 等不支持 sysconf 的平台
+                memory_limit = 0
+        workers = min(processes, slot_count, os.cpu_count() or 1)
+        if memory_limit > 0:
+            workers = min(workers, memory_limit // RENDER_MEMORY_PER_SLOT_BYTES)
+        return max(1, workers)
+
+    def process_slots_parallel(self,
+                               slots: list[tuple[str, list[Path]]],
+                               resample_area: str = "finest_area",
+                               processes: int = RENDER_PROCESSES
+                               ):
+        """
+        在多个工作进程中同时渲染多个时间点。每个进程的 Dask 和解压线程数为 CPU 核数 / 进程数，
+        总线程数不超过核数；同时在处理的时间点不超过进程数，内存占用有上限。
+        解压缓存由本进程管理：处理中的时间点保持固定，每完成一个时间点记录访问并淘汰。
+        """
+        workers = self.render_worker_count(processes, len(slots))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        logging.info("并行渲染 %s 个时间点: %s 个工作进程，每个进程 %s 个线程。", len(slots), workers, threads)
+
+        pending_slots = iter(slots)
+        running: dict[concurrent.futures.Future, tuple[str, list[Path], contextlib.ExitStack]] = {}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                    mp_context=multiprocessing.get_context("spawn"),
+                                                    initializer=_init_render_worker,
+                                                    initargs=(threads, self.products, self.skip_unchanged)) as executor:
+            while True:
+                # 同时提交的时间点不超过工作进程数，其余等有进程空闲时再提交
+                if len(running) < workers:
+                    for slot_key, slot_files in pending_slots:
+                        pin = contextlib.ExitStack()
+                        pin.enter_context(self.decompressed_cache.pinned(self.slot_output_paths(slot_files)))
+                        future = executor.submit(_render_slot, slot_files, resample_area)
+                        running[future] = (slot_key, slot_files, pin)
+                        logging.info("提交时间点: %s", slot_key)
+                        if len(running) >= workers:
+                            break
+                if not running:
+                    break
+
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    slot_key, slot_files, pin = running.pop(future)
+                    try:
+                        future.result()
+                        logging.info("时间点 %s 处理完成。", slot_key)
+                    except Exception as e:
+                        logging.error("时间点 %s 处理失败: %s", slot_key, e)
+                    self.decompressed_cache.touch(p for p in self.slot_output_paths(slot_files) if p.exists())
+                    pin.close()
+                self.decompressed_cache.evict()
+
+
+# 并行渲染工作进程中的处理器，由 _init_render_worker 创建
+_worker_processor: HimawariProcessor | None = None
+
+
+def _init_render_worker(threads: int, products: list[str], skip_unchanged: bool):
+    """
+    工作进程初始化：限制 Dask 和解压的线程数，创建不管理缓存的处理器。
+    """
+    global _worker_processor, MAX_DECOMPRESSION_THREADS
+    dask.config.set(scheduler="threads", num_workers=threads)
+    MAX_DECOMPRESSION_THREADS = threads
+    _worker_processor = HimawariProcessor(manage_cache=False, products=products, skip_unchanged=skip_unchanged)
+
+
+def _render_slot(slot_files: list[Path], resample_area: str):
+    """
+    在工作进程中处理一个时间点。
+    """
+    _worker_processor.process_slot(slot_files, resample_area)
 
-            self.process_true_data(decompressed_files=successful_files,
-                                   output_dir=OUTPUT_DIR,
-                                   resample_area=area
-                                   )
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,100 @@
+# 输出清单：记录每个时间点、每个产品由哪些输入文件和参数生成，二者都未变化时跳过处理
+#
+# 清单是输出目录下的 JSON 文件，键为 "时间点/区域/产品"，值为输入指纹和输出文件路径。
+# 同一时间点的不同区域（全圆盘、各自定义区域）分别记录，交替处理时互不覆盖。
+# 输入指纹由输入文件（通常是 .bz2，无需解压即可判断）的文件名、大小、修改时间和处理参数
+# 计算得到。只有图像成功写出后才记录，部分失败后重新运行只处理缺失或有变化的部分。
+# 多个进程可以同时记录：读-改-写在文件锁内进行，写入先写临时文件再原子替换。
+# 清单读入后缓存在内存中，以文件的修改时间、大小和 inode 为键；文件未变化时查询不再解析 JSON，
+# 批量检查大量时间点只需读取一次。
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterable
+
+from file_lock import file_lock
+
+MANIFEST_FILENAME = ".output_manifest.json"
+
+
+def input_fingerprint(input_files: Iterable[Path], params: dict) -> str | None:
+    """
+    输入文件集合（文件名、大小、修改时间）和处理参数的摘要。有文件无法访问时返回 None。
+    """
+    entries = []
+    for path in input_files:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        entries.append((Path(path).name, stat.st_size, stat.st_mtime_ns))
+    content = json.dumps({"inputs": sorted(entries), "params": params}, sort_keys=True)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class OutputManifest:
+    '已生成图像的清单，输入和参数未变化且输出文件存在时视为已完成'
+
+    def __init__(self, manifest_file: Path):
+        self.manifest_file = Path(manifest_file)
+        self._lock_file = self.manifest_file.with_name(self.manifest_file.name + ".lock")
+        self._entries: dict[str, dict] = {}
+        self._version: tuple | None = None
+
+    def _file_version(self) -> tuple | None:
+        try:
+            stat = os.stat(self.manifest_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _load(self) -> dict[str, dict]:
+        ''' 返回清单内容；文件自上次读取后未变化时直接使用缓存。'''
+        version = self._file_version()
+        if version == self._version:
+            return self._entries
+        entries = {}
+        if version is not None:
+            try:
+                loaded = json.loads(self.manifest_file.read_text(encoding="utf-8"))
+                entries = loaded if isinstance(loaded, dict) else {}
+            except (OSError, ValueError) as e:
+                logging.warning("忽略无法读取的输出清单 %s: %s", self.manifest_file, e)
+        self._entries, self._version = entries, version
+        return entries
+
+    def _save(self, entries: dict[str, dict]):
+        try:
+            temp_path = self.manifest_file.with_name(f"{self.manifest_file.name}.{os.getpid()}.tmp")
+            temp_path.write_text(json.dumps(entries, ensure_ascii=False), encoding="utf-8")
+            os.replace(temp_path, self.manifest_file)
+            self._entries, self._version = entries, self._file_version()
+        except OSError as e:
+            logging.warning("无法写入输出清单 %s: %s", self.manifest_file, e)
+
+    def is_current(self, slot_key: str, area: str, product: str, fingerprint: str | None) -> bool:
+        """
+        该时间点、该区域的产品已由相同的输入和参数生成，且输出文件仍然存在。
+        """
+        if fingerprint is None:
+            return False
+        entry = self._load().get(f"{slot_key}/{area}/{product}")
+        return (entry is not None and entry.get("fingerprint") == fingerprint
+                and Path(entry.get("output", "")).is_file())
+
+    def record(self, slot_key: str, area: str, outputs: dict[str, Path], fingerprint: str | None):
+        """
+        记录一个时间点在某区域成功写出的各产品输出文件 (产品 -> 路径)。
+        """
+        if fingerprint is None or not outputs:
+            return
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self._lock_file):
+            # 在锁内重新检查文件：其他进程写过时先读入它们的记录，再合并本次结果
+            entries = dict(self._load())
+            for product, output_path in outputs.items():
+                entries[f"{slot_key}/{area}/{product}"] = {"fingerprint": fingerprint, "output": str(output_path)}
+            self._save(entries)
@@ -0,0 +1,154 @@
+# Himawari 下载与处理流水线：边下载边解压、生成图像
+
+import argparse
+import logging
+import queue
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import download
+from hsd_utils import NAMED_REGIONS, parse_bbox
+from objective_main import PRODUCTS, HimawariProcessor
+
+# 等待处理的完整时间点数量上限。队列满时下载线程会暂停，避免数据堆积
+SLOT_QUEUE_SIZE = 2
+
+# 下载函数：接收“时间点已完整”的回调并执行下载
+SlotProducer = Callable[[Callable[[datetime, list[str]], None]], None]
+
+
+def run_pipeline(produce: SlotProducer,
+                 resample_area: str = "finest_area",
+                 queue_size: int = SLOT_QUEUE_SIZE,
+                 in_memory: bool = False,
+                 products: list[str] | None = None,
+                 skip_unchanged: bool = True):
+    """
+    下载线程把已完整下载（所有请求的波段/分段都在本地）的时间点放入有界队列，
+    主线程依次解压并生成图像，后续时间点的下载同时进行。
+    in_memory 为 True 时解压到内存文件系统，不写入解压目录。
+    products 为每个时间点生成的产品，默认 objective_main.PRODUCTS。
+    skip_unchanged 为 True 时跳过输出清单中输入和参数都未变化的时间点/产品。
+    """
+    processor = HimawariProcessor(products=products, skip_unchanged=skip_unchanged)
+    slot_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+    def on_slot_ready(slot: datetime, files: list[str]):
+        logging.info("时间点 %s 下载完成，加入处理队列。", slot.strftime("%Y-%m-%d %H:%M"))
+        slot_queue.put((slot, [Path(f) for f in files]))
+
+    def producer():
+        try:
+            produce(on_slot_ready)
+        except Exception as e:
+            logging.error("下载线程出错: %s", e, exc_info=True)
+        finally:
+            slot_queue.put(None)  # 通知消费者下载已结束
+
+    downloader = threading.Thread(target=producer, name="downloader", daemon=True)
+    downloader.start()
+
+    processed = 0
+    while True:
+        item = slot_queue.get()
+        if item is None:
+            break
+        slot, files = item
+        logging.info("开始处理时间点 %s (%s 个文件)", slot.strftime("%Y-%m-%d %H:%M"), len(files))
+        processor.process_slot(files, resample_area, in_memory)
+        processed += 1
+
+    downloader.join()
+    # 最后一个时间点处理时文件仍被固定，释放后再淘汰一次
+    if processor.decompressed_cache:
+        processor.decompressed_cache.evict()
+    logging.info("流水线完成，共处理 %s 个时间点。", processed)
+
+
+def _area_arg(text: str) -> str:
+    ''' finest_area、coarsest_area，或自定义区域（区域名或 lon_min,lon_max,lat_min,lat_max）。'''
+    if text in ("finest_area", "coarsest_area"):
+        return text
+    try:
+        parse_bbox(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return text
+
+
+def _products_arg(text: str) -> list[str]:
+    ''' 逗号分隔的产品列表，例如 true_color,B13,airmass。'''
+    products = [product.strip() for product in text.split(",") if product.strip()]
+    if not products:
+        raise argparse.ArgumentTypeError("产品列表不能为空")
+    return products
+
+
+def parse_args(argv: list[str] | None = None):
+    ''' 解析命令行参数，下载相关参数与 download.py 相同。'''
+    parser = download.build_arg_parser(add_help=False)
+    parser.description = "下载 Himawari 数据并在每个时间点下载完成后立即处理。"
+    parser.add_argument("-h", "--help", action="help", help="显示帮助并退出")
+    parser.add_argument("--area", type=_area_arg, default="finest_area",
+                        help="重采样区域: finest_area (默认)、coarsest_area，或只处理自定义区域 "
+                             f"({', '.join(NAMED_REGIONS)} 或 lon_min,lon_max,lat_min,lat_max)")
+    parser.add_argument("--products", type=_products_arg,
+                        default=PRODUCTS,
+                        help=f"逗号分隔的产品列表，从同一次加载中生成 (默认 {','.join(PRODUCTS)})，"
+                             "例如 true_color,B13,airmass,ash")
+    parser.add_argument("--force", action="store_true",
+                        help="忽略输出清单，重新生成已有的图像")
+    parser.add_argument("--queue-size", type=int, default=SLOT_QUEUE_SIZE,
+                        help=f"等待处理的时间点数量上限 (默认 {SLOT_QUEUE_SIZE})")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="解压到内存文件系统 (/dev/shm)，生成图像后立即删除，不占用磁盘")
+    return parser.parse_args(argv)
+
+
+def main():
+    ''' 流水线入口。'''
+    args = parse_args()
+    if download.FTP_HOST == "replace_with_host":
+        logging.error("未配置 FTP 账号，请创建 config.py。")
+        sys.exit(1)
+
+    options = download.download_options(args)
+
+    if args.watch:
+        bands = args.bands or download.DEFAULT_TARGET_BANDS
+
+        def produce(on_slot_ready):
+            download.watch_new_data(download.connect_sftp, bands, download.LOCAL_DATA_DIR,
+                                    args.poll_interval, args.max_backoff,
+                                    on_slot_ready=on_slot_ready, **options)
+    else:
+        start_dt = args.start or download.get_datetime_input("Enter start date and time")
+        end_dt = args.end or download.get_datetime_input("Enter end date and time")
+        bands = args.bands or download.get_band_input(download.DEFAULT_TARGET_BANDS)
+        time_points = download.generate_time_range(start_dt, end_dt)
+        if not time_points:
+            logging.info("没有需要处理的时间点。")
+            return
+
+        def produce(on_slot_ready):
+            transport, sftp = download.connect_sftp()
+            try:
+                download.download_data(sftp, time_points, bands, download.LOCAL_DATA_DIR,
+                                       on_slot_ready=on_slot_ready, **options)
+            finally:
+                sftp.close()
+                if transport.is_active():
+                    transport.close()
+
+    run_pipeline(produce, args.area, args.queue_size, args.in_memory, args.products, not args.force)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        logging.info("流水线被用户中断。")
+        sys.exit(1)